@@ -0,0 +1,50 @@
+# Benchmark of the dashboard chart payloads on the bundled dummy registers.
+# Builds the heatmap and trend figures at full resolution and with level-of-detail reduction, and reports
+# the JSON payload Plotly ships to the browser and the server-side build + serialization time.
+# Browser render time scales with the payload and is not measured here.
+#
+# Usage: python bench_charts.py
+
+import glob
+import os
+import time
+
+import pandas as pd
+import plotly.express as px
+
+from chart_lod import heatmap_data, trend_data
+from register_cache import load_registers
+from sales_cube import SalesCube
+
+REGISTER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dummy_sales_registers")
+
+
+def measure(build):
+    start = time.perf_counter()
+    payload = build().to_json()
+    return len(payload), time.perf_counter() - start
+
+
+def main():
+    cube = SalesCube()
+    cube.add_many(load_registers(sorted(glob.glob(os.path.join(REGISTER_DIR, "sales_register_*.csv")))))
+    ranges = {
+        "all years": (None, None),
+        "last year": (cube.max_date - pd.Timedelta(days=364), cube.max_date),
+    }
+
+    print(f"{'chart':<8} {'range':<10} {'mode':<5} {'shape':>10} {'payload KB':>11} {'build+json ms':>14}")
+    for label, (start, end) in ranges.items():
+        for full in (True, False):
+            mode = "full" if full else "lod"
+            heatmap = heatmap_data(cube, start, end, full=full)
+            size, elapsed = measure(lambda: px.imshow(heatmap))
+            print(f"{'heatmap':<8} {label:<10} {mode:<5} {str(heatmap.shape):>10} {size / 1024:>11.1f} {elapsed * 1000:>14.1f}")
+
+            trend = trend_data(cube, start, end, full=full)
+            size, elapsed = measure(lambda: px.line(trend, x=trend.columns[0], y='Qty Sold'))
+            print(f"{'trend':<8} {label:<10} {mode:<5} {str(trend.shape):>10} {size / 1024:>11.1f} {elapsed * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
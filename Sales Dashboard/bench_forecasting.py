@@ -0,0 +1,84 @@
+# Benchmark for the forecasting backends on the bundled dummy registers.
+# The last HOLDOUT days of every product's sales are held out; each backend is fitted on the rest and
+# scored on the held-out days (MAE/RMSE of daily demand). Prophet is fitted from a cold model cache.
+#
+# Usage: python bench_forecasting.py [--products 20] [--holdout 365] [--workers 4]
+
+import argparse
+import glob
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from forecasting import FourierBackend, ProphetBackend
+from register_cache import load_registers
+from sales_cube import SalesCube
+
+REGISTER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dummy_sales_registers")
+
+
+def split(series, holdout):
+    cutoff = max(data['ds'].max() for data in series.values()) - pd.Timedelta(days=holdout)
+    train = {product: data[data['ds'] <= cutoff] for product, data in series.items()}
+    test = {product: data[data['ds'] > cutoff] for product, data in series.items()}
+    train = {product: data for product, data in train.items() if len(data) >= 2}
+    return train, test
+
+
+def score(backend, train, test):
+    # Horizon long enough for every product's forecast to reach the end of the holdout
+    last_test = max(data['ds'].max() for data in test.values() if len(data))
+    periods = max((last_test - data['ds'].max()).days for data in train.values())
+    start = time.perf_counter()
+    daily = backend.daily_forecast(train, periods)
+    elapsed = time.perf_counter() - start
+
+    actual = pd.concat([test[product].assign(Product=product) for product in train], ignore_index=True)
+    merged = actual.merge(daily, on=['Product', 'ds'], how='left')
+    error = merged['yhat'].fillna(0).to_numpy() - merged['y'].to_numpy()
+    return elapsed, np.abs(error).mean(), np.sqrt((error ** 2).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark forecasting backends")
+    parser.add_argument("--products", type=int, default=20, help="Number of products to forecast")
+    parser.add_argument("--holdout", type=int, default=365, help="Days held out for scoring")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size for Prophet")
+    args = parser.parse_args()
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+
+    cube = SalesCube()
+    cube.add_many(load_registers(sorted(glob.glob(os.path.join(REGISTER_DIR, "sales_register_*.csv")))))
+    series = dict(list(cube.product_series().items())[:args.products])
+    train, test = split(series, args.holdout)
+
+    # Mean daily demand of each product, as the reference every backend should beat
+    mean_daily = pd.concat(
+        [pd.DataFrame({'Product': p, 'ds': d['ds'], 'yhat': train[p]['y'].mean()}) for p, d in test.items() if p in train]
+    )
+
+    class MeanBackend:
+        name = "Mean (reference)"
+
+        def daily_forecast(self, series, periods=365, progress=None):
+            return mean_daily
+
+    cache_dir = tempfile.mkdtemp(prefix="forecast_cache_")
+    try:
+        backends = [MeanBackend(), FourierBackend(), ProphetBackend(cache_dir=cache_dir, max_workers=args.workers)]
+        print(f"{len(train)} products, {args.holdout} day holdout")
+        print(f"{'backend':<20} {'fit+predict s':>14} {'MAE':>8} {'RMSE':>8}")
+        for backend in backends:
+            elapsed, mae, rmse = score(backend, train, test)
+            print(f"{backend.name:<20} {elapsed:>14.3f} {mae:>8.2f} {rmse:>8.2f}")
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    main()
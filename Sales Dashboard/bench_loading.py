@@ -0,0 +1,172 @@
+# Benchmark for loading multi-year sales registers.
+# Compares the original loop (pd.read_csv per file, growing the frame with repeated pd.concat) against
+# load_registers run serially, forced into a process pool, and with its default choice between the two
+# (auto: the pool only on a multi-CPU machine above PARALLEL_MIN_BYTES of uncached registers), on 1..N of the
+# bundled registers and on synthetic registers SCALE times larger. Serial, pool and auto timings start from a
+# cold ingestion cache; the warm column reloads the same registers once they are cached. On a multi-CPU machine,
+# the check fails if the pool is not faster than serial parsing on the full synthetic set, which is above the
+# threshold; on a single CPU the pool cannot win and the check is skipped.
+# The streaming check measures the peak memory (tracemalloc plus Arrow's memory pool) of SalesCube.add_csv and
+# load_cube(streaming=True) on one synthetic register STREAM_SCALE times larger than a bundled one, and fails if
+# either exceeds the memory ceiling, or if a ceiling too small for the reader's buffers does not raise MemoryError.
+#
+# Usage: python bench_loading.py [--scale 10] [--workers 4] [--stream-scale 1000] [--memory-limit-mb 128]
+
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from register_cache import PARALLEL_MIN_BYTES, file_key, load_registers
+from sales_cube import READER_BYTES, SalesCube
+from sales_engine import load_cube
+
+REGISTER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dummy_sales_registers")
+
+
+def baseline(files):
+    all_data = pd.DataFrame()
+    for file in files:
+        df = pd.read_csv(file)
+        df['Date'] = pd.to_datetime(df['Date'])
+        df['Week'] = df['Date'].dt.strftime('%Y-%U')
+        all_data = pd.concat([all_data, df])
+    return all_data
+
+
+def load(files, max_workers, cache_dir):
+    SalesCube().add_many(load_registers(files, cache_dir=cache_dir, max_workers=max_workers))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def timed_cold(files, max_workers, warm=False):
+    cache_dir = tempfile.mkdtemp(prefix="register_cache_")
+    try:
+        cold = timed(load, files, max_workers, cache_dir)
+        return timed(load, files, max_workers, cache_dir) if warm else cold
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def synthetic_registers(files, scale, out_dir):
+    """Write one register per input file with scale times as many random rows."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for file in files:
+        template = pd.read_csv(file)
+        n = len(template) * scale
+        dates = pd.to_datetime(template['Date'])
+        days = rng.integers(dates.min().value // 86_400_000_000_000, dates.max().value // 86_400_000_000_000, n)
+        df = pd.DataFrame({
+            'Date': pd.to_datetime(days, unit='D').strftime('%Y-%m-%d'),
+            'Product': rng.choice(template['Product'].unique(), n),
+            'Qty Sold': rng.integers(1, 100, n),
+        })
+        path = os.path.join(out_dir, os.path.basename(file))
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def run(label, files, workers):
+    """Time every loader on 1..N of files; returns (bytes, serial s, pool s) of the full set."""
+    print(f"\n{label}")
+    print(f"{'files':>5} {'rows':>10} {'MB':>6} {'baseline s':>11} {'serial s':>9} {'pool s':>7} {'auto s':>7} "
+          f"{'warm s':>7} {'speedup':>8}")
+    for n in range(1, len(files) + 1):
+        subset = files[:n]
+        rows = sum(sum(1 for _ in open(f)) - 1 for f in subset)
+        size = sum(os.path.getsize(f) for f in subset)
+        t_base = timed(baseline, subset)
+        t_serial = timed_cold(subset, 1)
+        t_pool = timed_cold(subset, workers)
+        t_auto = timed_cold(subset, None)
+        t_warm = timed_cold(subset, None, warm=True)
+        print(f"{n:>5} {rows:>10,} {size / 1024 ** 2:>6.1f} {t_base:>11.3f} {t_serial:>9.3f} {t_pool:>7.3f} "
+              f"{t_auto:>7.3f} {t_warm:>7.3f} {t_base / t_auto:>7.2f}x")
+    return size, t_serial, t_pool
+
+
+def peak_memory(fn, *args, **kwargs):
+    """
+    Peak memory, in bytes, of one call of fn: the traced peak plus the peak of Arrow's memory pool (which holds
+    pandas' Arrow-backed strings), an upper bound as the two need not peak at the same time.
+    """
+    default_pool = pa.default_memory_pool()
+    pool = pa.proxy_memory_pool(default_pool)
+    pa.set_memory_pool(pool)
+    tracemalloc.start()
+    try:
+        fn(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] + pool.max_memory()
+    finally:
+        tracemalloc.stop()
+        pa.set_memory_pool(default_pool)
+
+
+def run_streaming(file, scale, memory_limit, out_dir):
+    path, = synthetic_registers([file], scale, out_dir)
+    print(f"\nStreaming peak memory ({scale}x rows, {os.path.getsize(path) / 1024 ** 2:.0f} MB register, "
+          f"{memory_limit / 1024 ** 2:.0f} MB ceiling)")
+    peaks = {
+        "pd.read_csv": peak_memory(pd.read_csv, path),
+        "file_key": peak_memory(file_key, path),
+        "SalesCube.add_csv": peak_memory(SalesCube().add_csv, path, memory_limit=memory_limit),
+        "load_cube(streaming=True)": peak_memory(load_cube, [path], streaming=True, memory_limit=memory_limit),
+    }
+    for label, peak in peaks.items():
+        print(f"{label:<28} {peak / 1024 ** 2:>8.1f} MB")
+    for label in ("SalesCube.add_csv", "load_cube(streaming=True)"):
+        assert peaks[label] <= memory_limit, \
+            f"{label} peaked at {peaks[label] / 1024 ** 2:.1f} MB, above the {memory_limit / 1024 ** 2:.0f} MB ceiling"
+    try:
+        load_cube([path], streaming=True, memory_limit=READER_BYTES)
+    except MemoryError as e:
+        print(f"{READER_BYTES / 1024 ** 2:.0f} MB ceiling: MemoryError ({e})")
+    else:
+        raise AssertionError(f"a {READER_BYTES / 1024 ** 2:.0f} MB ceiling did not raise MemoryError")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sales register loading")
+    parser.add_argument("--scale", type=int, default=10, help="Row multiplier for the synthetic registers")
+    parser.add_argument("--workers", type=int, default=None, help="Size of the forced process pool (default: CPU count, at least 2)")
+    parser.add_argument("--stream-scale", type=int, default=1000, help="Row multiplier for the streaming check")
+    parser.add_argument("--memory-limit-mb", type=int, default=128, help="Memory ceiling of the streaming check")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(REGISTER_DIR, "sales_register_*.csv")))
+    workers = args.workers or max(os.cpu_count() or 1, 2)
+    run("Bundled registers", files, workers)
+
+    out_dir = tempfile.mkdtemp(prefix="synthetic_registers_")
+    try:
+        size, t_serial, t_pool = run(
+            f"Synthetic registers ({args.scale}x rows)", synthetic_registers(files, args.scale, out_dir), workers
+        )
+        if (os.cpu_count() or 1) < 2:
+            print("\nPool check skipped: a single CPU cannot parse in parallel, so auto always parses serially")
+        elif size >= PARALLEL_MIN_BYTES:
+            print(f"\nPool vs serial on {size / 1024 ** 2:.1f} MB ({os.cpu_count()} CPUs): {t_serial / t_pool:.2f}x")
+            assert t_pool < t_serial, f"the pool ({t_pool:.2f} s) is not faster than serial parsing ({t_serial:.2f} s)"
+        stream_dir = os.path.join(out_dir, "streaming")
+        os.makedirs(stream_dir)
+        run_streaming(files[0], args.stream_scale, args.memory_limit_mb * 1024 ** 2, stream_dir)
+    finally:
+        shutil.rmtree(out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Level-of-detail reduction of the dashboard chart payloads.
+# Plotly ships every cell of a heatmap and every point of a line to the browser, so over many years and
+# hundreds of products the full Week x Product matrix becomes megabytes of JSON. These helpers decimate
+# on the server to roughly what the chart can show: the finest of week/month/quarter that fits in
+# max_periods rows, and the top_n products of the range plus a single "Other" column.
+# Narrowing the date range (zooming in) refines the granularity again; full=True skips the reduction.
+
+import numpy as np
+import pandas as pd
+
+from sales_cube import SalesCube
+
+# Rows a heatmap/points a trend line can usefully show, and products kept in the heatmap
+MAX_PERIODS = 120
+MAX_POINTS = 400
+TOP_N = 20
+
+# Approximate period lengths in days, finest first
+PERIOD_DAYS = {'W': 7, 'M': 30.44, 'Q': 91.31}
+
+OTHER = "Other"
+
+
+def choose_freq(cube, start=None, end=None, max_periods=MAX_PERIODS):
+    """Finest roll-up frequency whose number of periods over [start, end] fits in max_periods."""
+    first = cube.min_date if start is None else max(pd.Timestamp(start), cube.min_date)
+    last = cube.max_date if end is None else min(pd.Timestamp(end), cube.max_date)
+    span = max((last - first).days + 1, 1)
+    for freq, days in PERIOD_DAYS.items():
+        if span / days <= max_periods:
+            return freq
+    return 'Q'
+
+
+def heatmap_data(cube, start=None, end=None, max_periods=MAX_PERIODS, top_n=TOP_N, full=False):
+    """
+    Period x Product sales for the heatmap, reduced to the viewport.
+
+    Args:
+        cube (SalesCube): Aggregate cube.
+        start, end: Date range.
+        max_periods (int): Maximum number of rows (periods).
+        top_n (int): Number of best selling products kept as columns; the rest are summed into "Other".
+        full (bool): Return the full Week x Product matrix instead.
+
+    Returns:
+        pd.DataFrame: Sums per period and product, NaN where a product had no sales in a period.
+    """
+    if full:
+        return cube.weekly_pivot(start, end)
+
+    qty, rows = cube.window(start, end)
+    if qty.shape[1] > top_n + 1:
+        # Reduce the product axis on the daily window first, so the roll-up only touches top_n + 1 columns
+        totals = qty.sum()
+        top = totals.sort_values(ascending=False, kind='stable').index[:top_n]
+        rest = qty.columns.difference(top)
+        qty = qty[top].assign(**{OTHER: qty[rest].sum(axis=1)})
+        rows = rows[top].assign(**{OTHER: rows[rest].sum(axis=1)})
+
+    name, labels = SalesCube.period_labels(qty.index, choose_freq(cube, start, end, max_periods))
+    labels = np.asarray(labels.astype(str))
+    pivot = qty.groupby(labels).sum().where(rows.groupby(labels).sum() > 0)
+    pivot.index.name = name
+    pivot.columns.name = 'Product'
+    return pivot
+
+
+def trend_data(cube, start=None, end=None, max_points=MAX_POINTS, full=False):
+    """
+    Total sales over time for the trend chart, weekly unless that exceeds max_points.
+
+    Returns:
+        pd.DataFrame: Period label column (Week, Month or Quarter) and 'Qty Sold'.
+    """
+    freq = 'W' if full else choose_freq(cube, start, end, max_points)
+    qty, rows = cube.window(start, end)
+    name, labels = SalesCube.period_labels(qty.index, freq)
+    trend = qty.sum(axis=1).groupby(np.asarray(labels.astype(str))).sum()
+    trend.index.name = name
+    return trend.rename('Qty Sold').reset_index()
+
+
+def period_title(frame):
+    """'Weekly', 'Monthly' or 'Quarterly', from the period column of a heatmap or trend frame."""
+    name = frame.index.name if frame.index.name else frame.columns[0]
+    return {'Week': 'Weekly', 'Month': 'Monthly', 'Quarter': 'Quarterly'}[name]
@@ -1,22 +1,17 @@
+import os
+
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from chart_lod import period_title
+from sales_engine import load_artifacts, load_cube, summarize
+
 # Set page configuration
 st.set_page_config(page_title="Sales Dashboard", layout="wide")
 st.title("Sales Dashboard")
 
-# Helper function to process uploaded CSV files and aggregate weekly data
-def process_sales_register(file):
-    df = pd.read_csv(file)
-    df['Date'] = pd.to_datetime(df['Date'])
-    df['Week'] = df['Date'].dt.strftime('%Y-%U')
-    weekly_demand = df.groupby(['Week', 'Product'])['Qty Sold'].sum().reset_index()
-    weekly_demand.rename(columns={'Qty Sold': 'Qty Sold'}, inplace=True)
-    return weekly_demand
-
 # Sidebar for inputs
 with st.sidebar:
     st.header("Input Section")
@@ -60,20 +55,61 @@ with st.sidebar:
     # Add button for adding more inputs
     st.button("Add Another Year", on_click=add_year_input)
 
+    # Streaming mode folds registers into the aggregates chunk by chunk, for registers larger than memory
+    streaming_mode = st.checkbox("Low-memory streaming mode", key="streaming_mode")
+    memory_limit_mb = st.number_input("Memory ceiling (MB)", min_value=16, value=256, step=16, disabled=not streaming_mode)
+
+    # Artifacts precomputed offline with sales_engine.py replace uploading and processing altogether
+    st.header("Or load precomputed results")
+    artifact_dir = st.text_input("Artifact directory", value=os.environ.get("SALES_ARTIFACT_DIR", ""))
+    load_artifacts_clicked = st.button("Load Artifacts", disabled=not artifact_dir)
+
 st.header("Processed Results")
 
+# Artifacts are loaded on request, or right at startup when SALES_ARTIFACT_DIR is set
+if load_artifacts_clicked or (os.environ.get("SALES_ARTIFACT_DIR") and "sales_cube" not in st.session_state):
+    artifacts = load_artifacts(artifact_dir)
+    st.session_state["sales_cube"] = artifacts["cube"]
+
+    for name, aggregated_df in artifacts["weekly"].items():
+        st.subheader(f"Weekly Aggregated Data for {name}")
+        st.dataframe(aggregated_df)
+
 # Process Files button functionality
 if st.button("Process Files", key="process_files"):
-    all_data = []  # Collect all processed dataframes
     results_displayed = False
 
+    # Parse all selected registers concurrently (or memory-map them from the ingestion cache)
+    uploaded = [(i, entry) for i, entry in enumerate(st.session_state.year_inputs) if entry["year"] and entry["file"]]
+    progress_bar = st.progress(0.0, text="Loading sales registers...")
+
+    def report_progress(done, total, index):
+        progress_bar.progress(done / total, text=f"Loaded {uploaded[index][1]['file'].name} ({done}/{total})")
+
+    try:
+        cube, weekly = load_cube(
+            [entry["file"] for _, entry in uploaded],
+            cube=st.session_state.get("sales_cube"),
+            streaming=streaming_mode,
+            memory_limit=memory_limit_mb * 1024 ** 2,
+            progress=report_progress,
+        )
+    except KeyError as e:
+        # Both loaders raise KeyError(column) for a register without one of the columns the cube needs
+        st.error(f"The {e.args[0]!r} column is missing in one of the sales registers.")
+        st.stop()
+    except MemoryError as e:
+        # Streaming raises it when the memory ceiling cannot hold the cube and a minimal chunk
+        st.error(f"{e}. Raise the memory ceiling to load these registers.")
+        st.stop()
+    weekly = {i: aggregated_df for (i, _), aggregated_df in zip(uploaded, weekly)}
+
     for i, entry in enumerate(st.session_state.year_inputs):
         year = entry["year"]
         file = entry["file"]
 
         if year and file:
-            # Process the file and aggregate the data
-            aggregated_df = pd.read_csv(file)
+            aggregated_df = weekly[i]
 
             # Save the processed data into session state
             var_name = f"demand_{str(year)[-2:]}"  # E.g., 'demand_24' for 2024
@@ -82,7 +118,6 @@ if st.button("Process Files", key="process_files"):
             # Display aggregated data
             st.subheader(f"Weekly Aggregated Data for {year}")
             st.dataframe(aggregated_df)
-            all_data.append(aggregated_df)
             results_displayed = True
 
         elif not file:
@@ -90,107 +125,86 @@ if st.button("Process Files", key="process_files"):
 
     if not results_displayed:
         st.write("No valid inputs provided. Please ensure you upload files for the selected years.")
+        st.session_state.pop("sales_cube", None)
     else:
-        # Combine all processed data for further analysis
-        all_data = pd.concat(all_data, ignore_index=True)
-
-        # Ensure the 'Date' column exists for filtering purposes
-        if 'Date' not in all_data.columns:
-            st.error("The 'Date' column is missing in the aggregated data.")
-        else:
-            # Ensure 'Date' column is in datetime format
-            all_data['Date'] = pd.to_datetime(all_data['Date'])
-
-            # Filter data based on date range
-            min_date = all_data['Date'].min().date()  # Get minimum date
-            max_date = all_data['Date'].max().date()  # Get maximum date
-            date_range = st.date_input(
-                "Select date range for analysis",
-                value=(min_date, max_date),
-                min_value=min_date,
-                max_value=max_date,
-            )
-
-            if len(date_range) == 2:
-                start_date, end_date = date_range
-                # Use .dt.date to compare with date objects
-                filtered_data = all_data[
-                    (all_data['Date'].dt.date >= start_date) & (all_data['Date'].dt.date <= end_date)
-                ]
-
-                # Summary statistics
-                total_sales = filtered_data['Qty Sold'].sum()
-                avg_daily_sales = (
-                    filtered_data.groupby('Date')['Qty Sold'].sum().mean()
-                )
-                top_product = (
-                    filtered_data.groupby('Product')['Qty Sold'].sum().idxmax()
-                )
-
-                # Metrics display
-                col1, col2, col3 = st.columns(3)
-                col1.metric("Total Sales", f"{total_sales:,}")
-                col2.metric("Avg Daily Sales", f"{avg_daily_sales:.2f}")
-                col3.metric("Top Selling Product", top_product)
-
-                # Weekly sales trend
-                weekly_sales = (
-                    filtered_data.groupby('Week')['Qty Sold'].sum().reset_index()
-                )
-                fig_trend = px.line(
-                    weekly_sales,
-                    x='Week',
-                    y='Qty Sold',
-                    title='Weekly Sales Trend',
-                )
-                st.plotly_chart(fig_trend, use_container_width=True)
-
-                # Product-wise sales
-                product_sales = (
-                    filtered_data.groupby('Product')['Qty Sold']
-                    .sum()
-                    .sort_values(ascending=False)
-                    .reset_index()
-                )
-                fig_product = px.bar(
-                    product_sales,
-                    x='Product',
-                    y='Qty Sold',
-                    title='Product-wise Sales',
-                )
-                st.plotly_chart(fig_product, use_container_width=True)
-
-                # Heatmap of weekly product sales
-                pivot_data = filtered_data.pivot_table(
-                    values='Qty Sold', index='Week', columns='Product', aggfunc='sum'
-                )
-                fig_heatmap = px.imshow(
-                    pivot_data, title='Weekly Product Sales Heatmap'
-                )
-                st.plotly_chart(fig_heatmap, use_container_width=True)
-
-                # Insights
-                st.subheader("Insights")
-                st.write(f"1. The total sales volume for the selected period is {total_sales:,} units.")
-                st.write(f"2. On average, {avg_daily_sales:.2f} units are sold daily.")
-                st.write(f"3. The top-selling product is '{top_product}'.")
-                st.write(f"4. There are {len(product_sales)} different products sold during this period.")
-
-                if len(weekly_sales) > 1:
-                    sales_trend = (
-                        "increasing"
-                        if weekly_sales['Qty Sold'].iloc[-1] > weekly_sales['Qty Sold'].iloc[0]
-                        else "decreasing"
-                    )
-                    st.write(f"5. The overall sales trend appears to be {sales_trend} over the selected period.")
-
-                # Seasonality check
-                if len(weekly_sales) >= 52:
-                    st.write("6. Potential seasonality in sales:")
-                    yearly_pattern = filtered_data.groupby(
-                        filtered_data['Date'].dt.month
-                    )['Qty Sold'].mean()
-                    peak_month = yearly_pattern.idxmax()
-                    trough_month = yearly_pattern.idxmin()
-                    st.write(f"   - Peak sales typically occur in month {peak_month}")
-                    st.write(f"   - Lowest sales typically occur in month {trough_month}")
+        st.session_state["sales_cube"] = cube
+
+# Analysis runs from the aggregate cube, whether it was built from uploads or loaded from artifacts
+if "sales_cube" in st.session_state:
+    cube = st.session_state["sales_cube"]
+
+    # Filter data based on date range
+    min_date = cube.min_date.date()  # Get minimum date
+    max_date = cube.max_date.date()  # Get maximum date
+    date_range = st.date_input(
+        "Select date range for analysis",
+        value=(min_date, max_date),
+        min_value=min_date,
+        max_value=max_date,
+    )
+
+    # Charts are decimated to month/quarter and the top products unless full resolution is requested;
+    # narrowing the date range brings back weekly detail
+    full_resolution = st.checkbox("Full resolution charts", value=False)
+
+    if len(date_range) == 2:
+        start_date, end_date = date_range
+
+        # Summary statistics, all read from the cube
+        summary = summarize(cube, start_date, end_date, full_resolution=full_resolution)
+        total_sales = summary['total_sales']
+        avg_daily_sales = summary['avg_daily_sales']
+        top_product = summary['top_product']
+        product_sales = summary['product_sales']
+        weekly_sales = summary['weekly_sales']
+
+        # Metrics display
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total Sales", f"{total_sales:,}")
+        col2.metric("Avg Daily Sales", f"{avg_daily_sales:.2f}")
+        col3.metric("Top Selling Product", top_product)
+
+        # Sales trend
+        trend = summary['trend']
+        fig_trend = px.line(
+            trend,
+            x=trend.columns[0],
+            y='Qty Sold',
+            title=f'{period_title(trend)} Sales Trend',
+        )
+        st.plotly_chart(fig_trend, use_container_width=True)
+
+        # Product-wise sales
+        fig_product = px.bar(
+            product_sales,
+            x='Product',
+            y='Qty Sold',
+            title='Product-wise Sales',
+        )
+        st.plotly_chart(fig_product, use_container_width=True)
+
+        # Heatmap of product sales over time
+        heatmap = summary['heatmap']
+        fig_heatmap = px.imshow(
+            heatmap, title=f'{period_title(heatmap)} Product Sales Heatmap'
+        )
+        st.plotly_chart(fig_heatmap, use_container_width=True)
+
+        # Insights
+        st.subheader("Insights")
+        st.write(f"1. The total sales volume for the selected period is {total_sales:,} units.")
+        st.write(f"2. On average, {avg_daily_sales:.2f} units are sold daily.")
+        st.write(f"3. The top-selling product is '{top_product}'.")
+        st.write(f"4. There are {len(product_sales)} different products sold during this period.")
+
+        if summary['sales_trend']:
+            st.write(f"5. The overall sales trend appears to be {summary['sales_trend']} over the selected period.")
+
+        # Seasonality check
+        if len(weekly_sales) >= 52:
+            st.write("6. Potential seasonality in sales:")
+            yearly_pattern = summary['monthly_mean']
+            peak_month = yearly_pattern.idxmax()
+            trough_month = yearly_pattern.idxmin()
+            st.write(f"   - Peak sales typically occur in month {peak_month}")
+            st.write(f"   - Lowest sales typically occur in month {trough_month}")
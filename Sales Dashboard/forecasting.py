@@ -0,0 +1,272 @@
+# Per-product demand forecasting with pluggable backends.
+# A backend turns daily ds/y series into daily predictions (the history plus `periods` future days);
+# monthly tables are summed from those predictions the same way for every backend.
+#
+# - ProphetBackend fits one Prophet model per product. Fitted models are serialized to JSON and cached on
+#   disk, keyed by the product and a fingerprint of its series, so reselecting a product or changing the
+#   horizon only reruns predict(), never fit(). Uncached models are fitted in a process pool. The disk cache is
+#   bounded to CACHE_MAX_BYTES and the in-process caches to MAX_MODELS / MAX_FORECASTS, least recently used first.
+# - FourierBackend fits a linear trend plus weekly/yearly Fourier terms to every product at once with a
+#   single batched weighted least-squares solve in NumPy. It is orders of magnitude faster than Prophet
+#   and does not import it.
+
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.environ.get(
+    "SALES_FORECAST_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".forecast_cache"),
+)
+CACHE_MAX_BYTES = 200 * 1024 ** 2    # Serialized models kept on disk (about 50 KB each)
+MAX_MODELS = 64    # Deserialized models kept in memory
+MAX_FORECASTS = 128    # Daily forecasts kept in memory, per (model, horizon)
+MIN_DAYS = 2    # Days of sales a product needs before a model can be fitted
+
+# Deserialized models and daily forecasts of this process, so reruns skip the JSON round trip
+# and the predict() call too; least recently used entries are dropped past their limits
+_models = OrderedDict()
+_forecasts = OrderedDict()
+
+
+def _remember(cache, key, value, limit):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > limit:
+        cache.popitem(last=False)
+    return value
+
+
+def series_fingerprint(product, product_data):
+    """Cache key of a product's model: the product name plus a hash of its ds/y series."""
+    digest = hashlib.sha256(str(product).encode())
+    digest.update(pd.util.hash_pandas_object(product_data[['ds', 'y']], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def _fit(product_data):
+    """Process pool worker: fit one Prophet model and return it serialized."""
+    from prophet import Prophet
+    from prophet.serialize import model_to_json
+
+    model = Prophet()
+    model.fit(product_data)
+    return model_to_json(model)
+
+
+def _store(key, model_json, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(key, cache_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(model_json)
+    os.replace(tmp_path, path)
+
+
+def _evict(cache_dir, keep=(), max_bytes=CACHE_MAX_BYTES):
+    """Delete the least recently used models past max_bytes, never the ones in keep."""
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".json"):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name[:-len(".json")] in keep:
+            continue
+        os.remove(os.path.join(cache_dir, name))
+        total -= size
+
+
+def _cached_model(key, cache_dir):
+    from prophet.serialize import model_from_json
+
+    if key in _models:
+        _models.move_to_end(key)
+        return _models[key]
+    path = _cache_path(key, cache_dir)
+    if os.path.exists(path):
+        with open(path) as f:
+            model = model_from_json(f.read())
+        os.utime(path)    # Mark as recently used for _evict
+        return _remember(_models, key, model, MAX_MODELS)
+    return None
+
+
+def _cached_forecast(key, periods, cache_dir):
+    if (key, periods) in _forecasts:
+        _forecasts.move_to_end((key, periods))
+        return _forecasts[key, periods]
+    model = _cached_model(key, cache_dir)
+    future = model.make_future_dataframe(periods=periods)
+    return _remember(_forecasts, (key, periods), model.predict(future)[['ds', 'yhat']], MAX_FORECASTS)
+
+
+class ProphetBackend:
+    """One cached Prophet model per product, fitted in a process pool when missing."""
+
+    name = "Prophet"
+
+    def __init__(self, cache_dir=CACHE_DIR, max_workers=None):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+
+    def get_model(self, product, product_data):
+        """Return the fitted model for a product's series, fitting it only if it is not cached."""
+        key = series_fingerprint(product, product_data)
+        if _cached_model(key, self.cache_dir) is None:
+            _store(key, _fit(product_data), self.cache_dir)
+            _evict(self.cache_dir, keep={key})
+        return _cached_model(key, self.cache_dir)
+
+    def daily_forecast(self, series, periods=365, progress=None):
+        keys = {product: series_fingerprint(product, data) for product, data in series.items()}
+        missing = [product for product, key in keys.items() if _cached_model(key, self.cache_dir) is None]
+        total = len(series)
+        done = total - len(missing)
+
+        if len(missing) > 1 and self.max_workers != 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {pool.submit(_fit, series[product]): product for product in missing}
+                for future in as_completed(futures):
+                    product = futures[future]
+                    _store(keys[product], future.result(), self.cache_dir)
+                    done += 1
+                    if progress:
+                        progress(done, total, product)
+        else:
+            for product in missing:
+                self.get_model(product, series[product])
+                done += 1
+                if progress:
+                    progress(done, total, product)
+
+        daily = pd.concat(
+            [_cached_forecast(keys[product], periods, self.cache_dir).assign(Product=product) for product in series],
+            ignore_index=True,
+        )
+        _evict(self.cache_dir, keep=set(keys.values()))
+        return daily
+
+
+class FourierBackend:
+    """Linear trend plus weekly and yearly Fourier terms, fitted to all products in one batched solve."""
+
+    name = "Fourier (NumPy)"
+
+    def __init__(self, weekly_order=3, yearly_order=10, ridge=1e-3):
+        self.weekly_order = weekly_order
+        self.yearly_order = yearly_order
+        self.ridge = ridge
+
+    def _design(self, days, span):
+        # Columns: intercept, trend, then sin/cos pairs for each seasonal harmonic
+        columns = [np.ones_like(days), days / span]
+        for period, order in ((7.0, self.weekly_order), (365.25, self.yearly_order)):
+            for k in range(1, order + 1):
+                angle = 2 * np.pi * k * days / period
+                columns += [np.sin(angle), np.cos(angle)]
+        return np.column_stack(columns)
+
+    def daily_forecast(self, series, periods=365, progress=None):
+        products = list(series)
+        first = min(data['ds'].min() for data in series.values())
+        last = max(data['ds'].max() for data in series.values())
+        dates = pd.date_range(first, last + pd.Timedelta(days=periods), freq='D')
+
+        # Dense Date x Product matrices: y holds the sales, weight marks the days a product was observed
+        y = np.zeros((len(dates), len(products)))
+        weight = np.zeros_like(y)
+        history_end = np.empty(len(products), dtype='datetime64[ns]')
+        for j, product in enumerate(products):
+            data = series[product]
+            rows = dates.get_indexer(data['ds'])
+            y[rows, j] = data['y'].to_numpy()
+            weight[rows, j] = 1.0
+            history_end[j] = data['ds'].max()
+
+        # Weighted normal equations of every product, solved as one batch of small systems
+        days = ((dates - first) / pd.Timedelta(days=1)).to_numpy()
+        x = self._design(days, max(days[-1] - periods, 1.0))
+        k = x.shape[1]
+        xtwx = (weight.T @ (x[:, :, None] * x[:, None, :]).reshape(len(dates), k * k)).reshape(-1, k, k)
+        xtwy = (weight * y).T @ x
+        xtwx += self.ridge * np.eye(k)
+        beta = np.linalg.solve(xtwx, xtwy[:, :, None])[:, :, 0]
+        yhat = x @ beta.T
+
+        # Same rows as Prophet's forecast frame: every observed day plus the periods days after the last one
+        end = history_end + np.timedelta64(periods, 'D')
+        keep = (weight > 0) | ((dates.to_numpy()[:, None] > history_end) & (dates.to_numpy()[:, None] <= end))
+        rows, cols = np.nonzero(keep)
+        if progress:
+            progress(len(products), len(products), products[-1])
+        return pd.DataFrame({
+            'ds': dates[rows],
+            'yhat': yhat[rows, cols],
+            'Product': np.asarray(products, dtype=object)[cols],
+        })
+
+
+BACKENDS = {
+    "prophet": ProphetBackend,
+    "fourier": FourierBackend,
+}
+
+
+def get_backend(name="prophet", **options):
+    return BACKENDS[name](**options)
+
+
+def to_monthly(daily):
+    """Sum daily predictions per product and month."""
+    monthly = daily.groupby(['Product', daily['ds'].dt.to_period('M')], sort=False)['yhat'].sum().reset_index()
+    monthly.columns = ['Product', 'Month', 'Predicted Demand']
+    return monthly.sort_values(['Product', 'Month'], kind='stable', ignore_index=True)
+
+
+def forecast_product(product, product_data, periods=365, backend=None):
+    """Monthly forecast for one product, from the cached model when the backend keeps one."""
+    backend = backend or get_backend()
+    monthly = to_monthly(backend.daily_forecast({product: product_data}, periods))
+    return monthly.drop(columns='Product')
+
+
+def fittable(series):
+    """The series of the products with at least MIN_DAYS days of sales; the others cannot be fitted."""
+    return {product: data for product, data in series.items() if len(data) >= MIN_DAYS}
+
+
+def forecast_all(series, periods=365, backend=None, progress=None):
+    """
+    Monthly forecasts for every product.
+
+    Args:
+        series (dict): Product name -> ds/y frame of its daily sales. Products with fewer than MIN_DAYS
+            days of sales cannot be fitted and are left out.
+        periods (int): Forecast horizon in days.
+        backend: Forecasting backend, ProphetBackend by default.
+        progress (callable): Called as progress(done, total, product) as each model becomes available.
+
+    Returns:
+        pd.DataFrame: Product, Month and Predicted Demand columns for all products; empty when no product
+        can be fitted.
+    """
+    series = fittable(series)
+    if not series:
+        empty = pd.DataFrame({'ds': pd.to_datetime([]), 'yhat': pd.Series(dtype=float), 'Product': pd.Series(dtype=object)})
+        return to_monthly(empty)
+    backend = backend or get_backend()
+    return to_monthly(backend.daily_forecast(series, periods, progress))
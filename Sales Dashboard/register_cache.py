@@ -0,0 +1,172 @@
+# Ingestion cache for sales registers.
+# Every register is parsed from CSV exactly once: the typed frame (Date as datetime64, Product and Week
+# as categoricals) is written to an uncompressed Feather file named after the SHA-256 of the raw CSV bytes.
+# Later loads of the same content memory-map that file instead of reparsing the CSV.
+# load_registers parses several registers concurrently in a process pool; workers only write the cache
+# files, and the parent memory-maps them, so no DataFrame is ever pickled between processes. The pool is only
+# used on a multi-CPU machine, when the uncached registers are large enough to pay for starting it.
+
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import pyarrow.feather as feather
+
+CACHE_DIR = os.environ.get(
+    "SALES_REGISTER_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".register_cache"),
+)
+
+# Bump whenever the typed schema written to the cache changes, so stale files are never picked up
+CACHE_VERSION = 1
+HASH_BLOCK_SIZE = 1024 ** 2    # Bytes read at a time by file_key
+# Uncached register bytes below which load_registers parses serially. Starting a pool costs ~30 ms with fork and
+# 1-2 s with spawn (each worker imports pandas), against parsing at a few MB/s.
+PARALLEL_MIN_BYTES = 4 * 1024 ** 2
+
+
+def _read_bytes(file):
+    """Return the raw bytes of a path, a Streamlit UploadedFile or any binary file-like object."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            return f.read()
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    file.seek(0)
+    data = file.read()
+    file.seek(0)
+    return data
+
+
+def register_key(data: bytes) -> str:
+    """Content hash used as the cache key of a register."""
+    digest = hashlib.sha256(f"v{CACHE_VERSION}:".encode())
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def file_key(file) -> str:
+    """Content hash of a register file (same as register_key of its bytes), read in fixed-size blocks."""
+    digest = hashlib.sha256(f"v{CACHE_VERSION}:".encode())
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            while block := f.read(HASH_BLOCK_SIZE):
+                digest.update(block)
+        return digest.hexdigest()
+    file.seek(0)
+    while block := file.read(HASH_BLOCK_SIZE):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def parse_register(data: bytes) -> pd.DataFrame:
+    """Parse raw CSV bytes into the typed frame the dashboards work with."""
+    df = pd.read_csv(io.BytesIO(data), dtype={"Product": "category"})
+    df["Date"] = pd.to_datetime(df["Date"])
+    df["Week"] = df["Date"].dt.strftime("%Y-%U").astype("category")
+    return df
+
+
+def cache_path(key: str, cache_dir: str = CACHE_DIR) -> str:
+    return os.path.join(cache_dir, f"{key}.feather")
+
+
+def _write_cache(df: pd.DataFrame, path: str) -> None:
+    # Write to a temporary name first so a concurrent reader never sees a half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def _load(data: bytes, key: str, cache_dir: str) -> pd.DataFrame:
+    path = cache_path(key, cache_dir)
+
+    if os.path.exists(path):
+        try:
+            return feather.read_table(path, memory_map=True).to_pandas()
+        except Exception:
+            # A truncated or corrupt cache file is simply rebuilt below
+            os.remove(path)
+
+    df = parse_register(data)
+    _write_cache(df, path)
+    return df
+
+
+def _convert(data: bytes, key: str, cache_dir: str) -> str:
+    """Process pool worker: parse one register into the cache and return the cache file path."""
+    path = cache_path(key, cache_dir)
+    if not os.path.exists(path):
+        _write_cache(parse_register(data), path)
+    return path
+
+
+def load_register(file, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """
+    Load a sales register, going through the columnar cache.
+
+    Args:
+        file: Path or file-like object holding the register CSV.
+        cache_dir (str): Directory holding the cached Feather files.
+
+    Returns:
+        pd.DataFrame: Register with Date, Product, Qty Sold and Week columns.
+    """
+    data = _read_bytes(file)
+    return _load(data, register_key(data), cache_dir)
+
+
+def load_registers(files, cache_dir: str = CACHE_DIR, max_workers=None, progress=None):
+    """
+    Load several sales registers, parsing the ones missing from the cache concurrently.
+
+    Args:
+        files (list): Paths or file-like objects holding the register CSVs.
+        cache_dir (str): Directory holding the cached Feather files.
+        max_workers (int): Size of the process pool. None uses one process per CPU, but only on a multi-CPU
+            machine when the uncached registers total at least PARALLEL_MIN_BYTES; 1 parses serially.
+        progress (callable): Called as progress(done, total, index) each time a register is ready,
+            where index is the position of that register in files.
+
+    Returns:
+        list: (key, DataFrame) pairs in the order of files.
+    """
+    datas = [_read_bytes(file) for file in files]
+    keys = [register_key(data) for data in datas]
+    total = len(files)
+    done = 0
+
+    # One parse per distinct content that is not cached yet
+    pending = {}
+    for i, key in enumerate(keys):
+        if key not in pending and not os.path.exists(cache_path(key, cache_dir)):
+            pending[key] = i
+
+    if max_workers is None:
+        parallel = (os.cpu_count() or 1) > 1 and sum(len(datas[i]) for i in pending.values()) >= PARALLEL_MIN_BYTES
+    else:
+        parallel = max_workers > 1
+
+    ready = set()
+    if len(pending) > 1 and parallel:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(_convert, datas[i], key, cache_dir): i for key, i in pending.items()}
+            for future in as_completed(futures):
+                future.result()
+                done += 1
+                ready.add(futures[future])
+                if progress:
+                    progress(done, total, futures[future])
+
+    registers = []
+    for i, (data, key) in enumerate(zip(datas, keys)):
+        registers.append((key, _load(data, key, cache_dir)))
+        if i not in ready:
+            done += 1
+            if progress:
+                progress(done, total, i)
+    return registers
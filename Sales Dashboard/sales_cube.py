@@ -0,0 +1,502 @@
+# Materialized Date x Product aggregate cube for the sales dashboards.
+# Raw registers are folded into two wide daily frames (quantity sums and row counts) once per upload set.
+# Every metric and chart is then derived from the cube, so changing the date range costs
+# O(days x products) instead of O(raw rows). Adding a register only folds that register's rows in.
+# On top of the cube, cumulative per-product sums over the sorted dates answer range totals with two
+# binary searches and one vector subtraction.
+# add_csv streams a register in bounded-size chunks straight into the cube, so registers larger than
+# memory never have to be materialized as a DataFrame. Its memory ceiling covers the cube itself, the long
+# (Date, Product) partial sums and the copy made while folding them in, not just the chunks.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+# Default memory ceiling for streaming a register, in bytes
+MEMORY_LIMIT = int(os.environ.get("SALES_MEMORY_LIMIT", 256 * 1024 ** 2))
+# Register columns the cube is built from
+COLUMNS = ['Date', 'Product', 'Qty Sold']
+# Streaming budget: peak memory while parsing and grouping a chunk, and while combining partial sums, relative to
+# the in-memory size of the rows or sums involved, plus the fixed buffers of the CSV reader (measured with
+# bench_loading.py). A chunk is never smaller than MIN_CHUNK_ROWS rows; a ceiling without room for one raises
+# MemoryError.
+CHUNK_OVERHEAD = 2
+COMBINE_OVERHEAD = 4
+READER_BYTES = 2 * 1024 ** 2
+MIN_CHUNK_ROWS = 1000
+# Text columns are streamed as Python strings rather than Arrow ones: the parser shares repeated values, so the
+# sampled footprint bounds them, and they go back to Python's allocator instead of staying in Arrow's memory pool
+TEXT_DTYPES = {'Date': object, 'Product': object}
+
+
+def _nbytes(frame):
+    return int(frame.memory_usage(deep=True, index=True).sum())
+
+
+def _codes(values, known):
+    """Positions of values in known extended by their new distinct values, and those new values."""
+    codes, uniques = pd.factorize(values)
+    new = uniques[known.get_indexer(uniques) < 0]
+    return (known.append(new) if len(new) else known).get_indexer(uniques)[codes], new
+
+
+def _reduce(keys, columns):
+    """
+    Sum each of columns per distinct key; returns the sorted distinct keys followed by one array of sums per
+    column. columns may be a generator, so that only one column is materialized at a time.
+    """
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    keys = keys[starts]
+    return (keys, *(np.add.reduceat(column[order], starts) for column in columns))
+
+
+def _concat(sums, partials):
+    """Combine partial sums (see _reduce) into one set of sums."""
+    parts = [part for part in (sums, *partials) if part is not None]
+    if not parts:
+        return (np.empty(0, dtype=np.int64),) * 3
+    # The concatenated keys are only referenced by _reduce, which lets go of them once sorted
+    return _reduce(
+        np.concatenate([part[0] for part in parts]), (np.concatenate([part[i] for part in parts]) for i in (1, 2))
+    )
+
+
+class SalesCube:
+    """Daily Date x Product sums of 'Qty Sold', with week/month roll-ups."""
+
+    def __init__(self):
+        self.qty = pd.DataFrame()     # Date x Product sums of 'Qty Sold'
+        self.rows = pd.DataFrame()    # Date x Product number of register rows (0 means not observed)
+        self.keys = set()             # Content keys of the registers folded in so far
+        self._prefix = None           # (dates, cumulative qty, cumulative rows), rebuilt lazily after add()
+
+    def save(self, directory):
+        """Write the cube to directory as Feather files plus the folded-in register keys."""
+        os.makedirs(directory, exist_ok=True)
+        feather.write_feather(self.qty.reset_index(), os.path.join(directory, "cube_qty.feather"))
+        feather.write_feather(self.rows.reset_index(), os.path.join(directory, "cube_rows.feather"))
+        with open(os.path.join(directory, "cube_keys.json"), "w") as f:
+            json.dump(sorted(self.keys), f)
+
+    @classmethod
+    def load(cls, directory):
+        """Read a cube written by save(), memory-mapping its Feather files."""
+        cube = cls()
+        cube.qty = feather.read_table(os.path.join(directory, "cube_qty.feather"), memory_map=True).to_pandas().set_index('Date')
+        cube.rows = feather.read_table(os.path.join(directory, "cube_rows.feather"), memory_map=True).to_pandas().set_index('Date')
+        with open(os.path.join(directory, "cube_keys.json")) as f:
+            cube.keys = set(json.load(f))
+        return cube
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    @property
+    def empty(self):
+        return self.qty.empty
+
+    @property
+    def min_date(self):
+        return self.qty.index[0]
+
+    @property
+    def max_date(self):
+        return self.qty.index[-1]
+
+    def add(self, df, key=None):
+        """
+        Fold a register into the cube. Registers already folded in (same key) are skipped.
+
+        Args:
+            df (pd.DataFrame): Register with Date, Product and Qty Sold columns.
+            key (str): Content key of the register, see register_cache.register_key.
+
+        Returns:
+            bool: True if the register was folded in, False if it was already part of the cube.
+        """
+        if key is not None and key in self.keys:
+            return False
+
+        self._fold(self._group(df))
+        if key is not None:
+            self.keys.add(key)
+        return True
+
+    @staticmethod
+    def _group(df):
+        grouped = df.groupby(['Date', 'Product'], observed=True)['Qty Sold'].agg(['sum', 'size'])
+        grouped.columns = ['qty', 'rows']
+        return grouped
+
+    @property
+    def nbytes(self):
+        """In-memory size of the cube frames."""
+        return _nbytes(self.qty) + _nbytes(self.rows)
+
+    def _grow(self, dates, products, dtype, memory_limit=None, reserved=0):
+        """
+        New zeroed (qty, rows) arrays over the cube's days and products plus the given ones, holding the cube.
+
+        With memory_limit, raises MemoryError when the current cube, the new arrays and reserved bytes
+        would not fit in it.
+        """
+        if self.qty.empty:
+            index, columns = dates.sort_values(), products.sort_values()
+        else:
+            index, columns = self.qty.index.union(dates), self.qty.columns.union(products)
+            dtype = np.result_type(dtype, *self.qty.dtypes)
+        index.name, columns.name = 'Date', 'Product'
+        shape = (len(index), len(columns))
+        if memory_limit is not None:
+            needed = self.nbytes + shape[0] * shape[1] * (np.dtype(dtype).itemsize + 8) + reserved
+            if needed > memory_limit:
+                raise MemoryError(
+                    f"Folding needs {needed / 1024 ** 2:.1f} MB for a {shape[0]} days x {shape[1]} products cube, "
+                    f"above the {memory_limit / 1024 ** 2:.1f} MB memory ceiling"
+                )
+        qty, rows = np.zeros(shape, dtype=dtype), np.zeros(shape, dtype=np.int64)
+        if not self.qty.empty:
+            at = np.ix_(index.get_indexer(self.qty.index), columns.get_indexer(self.qty.columns))
+            qty[at] = self.qty.to_numpy()
+            rows[at] = self.rows.to_numpy()
+        return index, columns, qty, rows
+
+    def _set(self, index, columns, qty, rows):
+        self.qty = pd.DataFrame(qty, index=index, columns=columns, copy=False)
+        self.rows = pd.DataFrame(rows, index=index, columns=columns, copy=False)
+        self._prefix = None
+
+    def _fold(self, grouped, memory_limit=None, reserved=0):
+        """
+        Merge (Date, Product)-indexed qty/rows sums into the cube.
+
+        The grown cube is allocated once and the sums are scatter-added into it as integers, so a fold costs
+        one new copy of the cube and no float round trip.
+        """
+        grouped = grouped.set_axis(grouped.index.remove_unused_levels())
+        (date_level, product_level), (date_codes, product_codes) = grouped.index.levels, grouped.index.codes
+        product_level = product_level.astype(str)
+        # The copied level codes, the flat scatter positions below and the cells gathered to add to
+        reserved += date_codes.nbytes + product_codes.nbytes + 2 * 8 * len(grouped)
+        index, columns, qty, rows = self._grow(
+            date_level, product_level, grouped['qty'].dtype, memory_limit, reserved
+        )
+        cells = index.get_indexer(date_level)[date_codes] * len(columns)
+        cells += columns.get_indexer(product_level)[product_codes]
+        qty.ravel()[cells] += grouped['qty'].to_numpy()
+        rows.ravel()[cells] += grouped['rows'].to_numpy()
+        self._set(index, columns, qty, rows)
+
+    def merge(self, other):
+        """Fold another cube into this one, skipping it if all of its registers are already folded in."""
+        if other.empty or (other.keys and other.keys <= self.keys):
+            return False
+        index, columns, qty, rows = self._grow(other.qty.index, other.qty.columns, other.qty.dtypes.iloc[0])
+        at = np.ix_(index.get_indexer(other.qty.index), columns.get_indexer(other.qty.columns))
+        qty[at] += other.qty.to_numpy()
+        rows[at] += other.rows.to_numpy()
+        self._set(index, columns, qty, rows)
+        self.keys |= other.keys
+        return True
+
+    @classmethod
+    def read_sums(cls, file, memory_limit=MEMORY_LIMIT, reserved=0):
+        """
+        Stream a register CSV into (Date, Product)-indexed qty/rows sums, without loading it as a whole.
+
+        Each chunk is reduced to partial sums right away, and partials are combined whenever the next chunk
+        would not fit otherwise. Chunks are sized from what is left of memory_limit once reserved bytes (e.g.
+        the cube being built) and the partial sums so far, with room to combine them, are set aside.
+
+        Args:
+            file: Path or file-like object holding the register CSV.
+            memory_limit (int): Memory ceiling in bytes.
+            reserved (int): Bytes of memory_limit already in use.
+
+        Returns:
+            pd.DataFrame: qty and rows columns, indexed by Date and Product.
+
+        Raises:
+            KeyError: The register lacks one of COLUMNS.
+            MemoryError: memory_limit leaves no room for a chunk of MIN_CHUNK_ROWS rows.
+        """
+        # Size chunks from the in-memory footprint of a sample
+        sample = pd.read_csv(file, nrows=1000, dtype=TEXT_DTYPES)
+        if hasattr(file, "seek"):
+            file.seek(0)
+        for column in COLUMNS:
+            if column not in sample.columns:
+                raise KeyError(column)    # Like the typed loader, instead of the reader's usecols ValueError
+        row_bytes = CHUNK_OVERHEAD * max(_nbytes(sample[COLUMNS]) / max(len(sample), 1), 1)
+        del sample
+
+        # Partial sums are (key, qty, rows) arrays keyed by the positions of the day in dates and of the product
+        # in products, both in order of first appearance: 24 bytes per (Date, Product) pair
+        reserved += READER_BYTES
+        dates, products = pd.DatetimeIndex([]), pd.Index([], dtype=str)
+        sums, partials, held = None, [], 0
+        with pd.read_csv(file, usecols=COLUMNS, dtype=TEXT_DTYPES, chunksize=MIN_CHUNK_ROWS) as reader:
+            while True:
+                free = memory_limit - reserved - COMBINE_OVERHEAD * held
+                if free < MIN_CHUNK_ROWS * row_bytes and partials:
+                    sums, partials = _concat(sums, partials), []
+                    held = sum(array.nbytes for array in sums)
+                    free = memory_limit - reserved - COMBINE_OVERHEAD * held
+                if free < MIN_CHUNK_ROWS * row_bytes:
+                    raise MemoryError(
+                        f"The {memory_limit / 1024 ** 2:.1f} MB memory ceiling leaves no room for a "
+                        f"{MIN_CHUNK_ROWS}-row chunk next to the {(reserved + held) / 1024 ** 2:.1f} MB already in use"
+                    )
+                try:
+                    chunk = reader.get_chunk(int(free // row_bytes))
+                except StopIteration:
+                    break
+                day_codes, new_days = _codes(pd.to_datetime(chunk['Date']), dates)
+                product_codes, new_products = _codes(chunk['Product'], products)
+                dates, products = dates.append(new_days), products.append(new_products.astype(str))
+                keys = (day_codes.astype(np.int64) << 32) | product_codes
+                partials.append(_reduce(keys, (chunk['Qty Sold'].to_numpy(), np.ones(len(keys), dtype=np.int64))))
+                held += sum(array.nbytes for array in partials[-1])
+                del chunk, day_codes, product_codes, keys
+
+        keys, qty, rows = _concat(sums, partials)
+        del sums, partials
+        index = pd.MultiIndex(
+            levels=[dates, products], codes=[keys >> 32, keys & 0xFFFFFFFF], names=['Date', 'Product'],
+            verify_integrity=False,
+        )
+        return pd.DataFrame({'qty': qty, 'rows': rows}, index=index)
+
+    def add_sums(self, sums, key=None, memory_limit=None, reserved=0):
+        """
+        Fold (Date, Product)-indexed qty/rows sums (see read_sums) into the cube.
+
+        Args:
+            sums (pd.DataFrame): Sums of one register.
+            key (str): Content key of the register, see register_cache.register_key.
+            memory_limit (int): Memory ceiling in bytes for the fold, if any.
+            reserved (int): Bytes of memory_limit in use besides the cube and the sums.
+
+        Returns:
+            bool: True if the register was folded in, False if it was already part of the cube.
+        """
+        if key is not None and key in self.keys:
+            return False
+        if len(sums):
+            self._fold(sums, memory_limit, reserved + _nbytes(sums))
+        if key is not None:
+            self.keys.add(key)
+        return True
+
+    def add_csv(self, file, key=None, memory_limit=MEMORY_LIMIT, reserved=0):
+        """
+        Stream a register CSV into the cube in chunks, without loading it as a whole.
+
+        Peak memory, including the cube, its partial sums and the copy made while folding them in, stays
+        within memory_limit whatever the size of the register.
+
+        Args:
+            file: Path or file-like object holding the register CSV.
+            key (str): Content key of the register, see register_cache.register_key.
+            memory_limit (int): Memory ceiling in bytes.
+            reserved (int): Bytes of memory_limit in use besides the cube.
+
+        Returns:
+            bool: True if the register was folded in, False if it was already part of the cube.
+
+        Raises:
+            MemoryError: memory_limit is too small for the cube and a minimal chunk.
+        """
+        if key is not None and key in self.keys:
+            return False
+        sums = self.read_sums(file, memory_limit, reserved + self.nbytes)
+        return self.add_sums(sums, key, memory_limit, reserved)
+
+    def add_many(self, registers):
+        """
+        Fold several registers in with a single concatenation, group-by and merge.
+
+        Args:
+            registers (list): (key, DataFrame) pairs, as returned by register_cache.load_registers.
+
+        Returns:
+            int: Number of registers folded in.
+        """
+        new, seen = [], set()
+        for key, df in registers:
+            if key is None or (key not in self.keys and key not in seen):
+                new.append(df)
+                seen.add(key)
+        if not new:
+            return 0
+        self.add(pd.concat(new, ignore_index=True))
+        self.keys |= seen - {None}
+        return len(new)
+
+    def _prefix_index(self):
+        if self._prefix is None:
+            n_products = self.qty.shape[1]
+            # A leading zero row makes every range total a plain difference of two rows
+            cum_qty = np.zeros((len(self.qty) + 1, n_products), dtype=self.qty.to_numpy().dtype)
+            cum_rows = np.zeros((len(self.rows) + 1, n_products), dtype=np.int64)
+            np.cumsum(self.qty.to_numpy(), axis=0, out=cum_qty[1:])
+            np.cumsum(self.rows.to_numpy(), axis=0, out=cum_rows[1:])
+            self._prefix = (self.qty.index.to_numpy(), cum_qty, cum_rows)
+        return self._prefix
+
+    def _bounds(self, start=None, end=None):
+        """Positions [i, j) of the days within [start, end], found by binary search on the sorted dates."""
+        dates = self._prefix_index()[0]
+        i = 0 if start is None else np.searchsorted(dates, pd.Timestamp(start).to_datetime64(), side='left')
+        if end is None:
+            j = len(dates)
+        else:
+            # Inclusive of the whole end day
+            end = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+            j = np.searchsorted(dates, end.to_datetime64(), side='left')
+        return i, max(i, j)
+
+    def range_totals(self, start=None, end=None):
+        """
+        Per-product totals over [start, end] from the prefix sums, in O(products).
+
+        Returns:
+            tuple: (qty, rows, days) with qty/rows as per-product vectors aligned with the cube
+                columns and days the number of days with sales in the range.
+        """
+        _, cum_qty, cum_rows = self._prefix_index()
+        i, j = self._bounds(start, end)
+        return cum_qty[j] - cum_qty[i], cum_rows[j] - cum_rows[i], j - i
+
+    def window(self, start=None, end=None):
+        """Return the (qty, rows) daily frames restricted to [start, end], dropping unobserved products."""
+        i, j = self._bounds(start, end)
+        qty = self.qty.iloc[i:j]
+        rows = self.rows.iloc[i:j]
+        observed = rows.columns[self.range_totals(start, end)[1] > 0]
+        return qty[observed], rows[observed]
+
+    def total_sales(self, start=None, end=None):
+        qty, _, _ = self.range_totals(start, end)
+        return qty.sum()
+
+    def avg_daily_sales(self, start=None, end=None):
+        # Every day in the index has at least one register row, matching groupby('Date').mean()
+        qty, _, days = self.range_totals(start, end)
+        return qty.sum() / days if days else np.nan
+
+    def product_sales(self, start=None, end=None):
+        """Total 'Qty Sold' per product, best selling first."""
+        qty, rows, _ = self.range_totals(start, end)
+        observed = rows > 0
+        product_sales = pd.Series(qty[observed], index=self.qty.columns[observed], name='Qty Sold')
+        product_sales = product_sales.sort_values(ascending=False, kind='stable')
+        product_sales.index.name = 'Product'
+        return product_sales.reset_index()
+
+    def top_product(self, start=None, end=None):
+        """Best selling product in [start, end], or None if nothing was sold."""
+        qty, rows, _ = self.range_totals(start, end)
+        observed = np.flatnonzero(rows > 0)
+        if not len(observed):
+            return None
+        return self.qty.columns[observed[np.argmax(qty[observed])]]
+
+    # Roll-up frequencies: label of the period column and how each day is labelled
+    PERIODS = {
+        'W': ('Week', lambda index: index.strftime('%Y-%U')),
+        'M': ('Month', lambda index: index.to_period('M')),
+        'Q': ('Quarter', lambda index: index.to_period('Q')),
+    }
+
+    @classmethod
+    def period_labels(cls, index, freq):
+        """Period name and per-day labels of a daily index for a roll-up frequency."""
+        if freq not in cls.PERIODS:
+            raise ValueError(f"Unsupported roll-up frequency: {freq}")
+        name, label = cls.PERIODS[freq]
+        return name, label(index)
+
+    def rollup(self, freq='W', start=None, end=None):
+        """
+        Roll the daily cube up to weeks ('%Y-%U' labels, freq='W'), calendar months (freq='M')
+        or quarters (freq='Q').
+
+        Returns:
+            tuple: (qty, rows) frames indexed by period label, one column per product.
+        """
+        qty, rows = self.window(start, end)
+        name, labels = self.period_labels(qty.index, freq)
+        qty = qty.groupby(labels).sum()
+        rows = rows.groupby(labels).sum()
+        qty.index.name = rows.index.name = name
+        return qty, rows
+
+    def weekly_sales(self, start=None, end=None):
+        """Total 'Qty Sold' per week, as the weekly trend chart expects."""
+        qty, _ = self.rollup('W', start, end)
+        return qty.sum(axis=1).rename('Qty Sold').reset_index()
+
+    def weekly_pivot(self, start=None, end=None):
+        """Week x Product sums, NaN where a product had no rows that week (same as pivot_table)."""
+        qty, rows = self.rollup('W', start, end)
+        pivot = qty.where(rows > 0)
+        pivot.columns.name = 'Product'
+        return pivot
+
+    def monthly_mean(self, start=None, end=None):
+        """Mean 'Qty Sold' per register row for each calendar month (1-12)."""
+        qty, rows = self.window(start, end)
+        month = qty.index.month
+        return qty.sum(axis=1).groupby(month).sum() / rows.sum(axis=1).groupby(month).sum()
+
+    def product_daily(self, product, start=None, end=None):
+        """Daily 'Qty Sold' for one product, as a Prophet-ready ds/y frame."""
+        qty, rows = self.window(start, end)
+        observed = rows[product] > 0
+        series = qty.loc[observed, product]
+        return pd.DataFrame({'ds': series.index, 'y': series.to_numpy()})
+
+    def product_series(self, start=None, end=None):
+        """Daily ds/y frames of every product sold in [start, end], from a single window."""
+        qty, rows = self.window(start, end)
+        series = {}
+        for product in qty.columns:
+            observed = rows[product].to_numpy() > 0
+            series[product] = pd.DataFrame({'ds': qty.index[observed], 'y': qty[product].to_numpy()[observed]})
+        return series
+
+    @classmethod
+    def weekly_demand_of(cls, sums):
+        """weekly_demand() of a cube holding only the given (Date, Product) sums (see read_sums)."""
+        (date_level, product_level), (date_codes, product_codes) = sums.index.levels, sums.index.codes
+        # Sum into a dense Week x Product array, a few days' worth of the daily cube, with weeks and products in
+        # sorted order so that its observed cells come out sorted without sorting the Product strings
+        week_codes, weeks = pd.factorize(cls.period_labels(date_level, 'W')[1], sort=True)
+        product_order = product_level.argsort()
+        product_ranks = np.empty(len(product_level), dtype=np.intp)
+        product_ranks[product_order] = np.arange(len(product_level))
+        cells = week_codes[date_codes] * len(product_level) + product_ranks[product_codes]
+        totals = np.zeros(len(weeks) * len(product_level), dtype=sums['qty'].dtype)
+        np.add.at(totals, cells, sums['qty'].to_numpy())
+        observed = np.zeros(len(totals), dtype=bool)
+        observed[cells] = True
+        del cells
+        cells = np.flatnonzero(observed)
+        return pd.DataFrame({
+            'Week': weeks[cells // len(product_level)],
+            'Product': product_level[product_order].astype(str)[cells % len(product_level)],
+            'Qty Sold': totals[cells],
+        })
+
+    def weekly_demand(self):
+        """Week, Product and 'Qty Sold' rows of every observed (week, product) pair."""
+        qty, rows = self.rollup('W')
+        observed = rows.stack() > 0
+        weekly = qty.stack()[observed].rename('Qty Sold').reset_index()
+        return weekly.sort_values(['Week', 'Product'], kind='stable', ignore_index=True)
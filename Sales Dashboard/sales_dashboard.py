@@ -1,19 +1,19 @@
+import os
+
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from prophet import Prophet
+
+from forecasting import MIN_DAYS, fittable, forecast_all, forecast_product, get_backend
+from chart_lod import period_title
+from sales_engine import load_artifacts, load_cube, summarize
 
 st.set_page_config(page_title="Sales Dashboard", layout="wide")
 st.title("Sales Dashboard")
 
-def process_sales_register(file):
-    df = pd.read_csv(file)
-    df['Date'] = pd.to_datetime(df['Date'])
-    df['Week'] = df['Date'].dt.strftime('%Y-%U')
-    weekly_demand = df.groupby(['Week', 'Product'])['Qty Sold'].sum().reset_index()
-    return df, weekly_demand
+# Forecasting engine labels shown in the UI -> forecasting backend names
+ENGINES = {"Prophet": "prophet", "Fast (NumPy trend + seasonality)": "fourier"}
 
 if "year_inputs" not in st.session_state:
     st.session_state["year_inputs"] = []
@@ -57,20 +57,64 @@ with st.sidebar:
                 remove_year_input(i)
                 st.rerun()
 
+    # Streaming mode folds registers into the aggregates chunk by chunk, for registers larger than memory
+    streaming_mode = st.checkbox("Low-memory streaming mode", key="streaming_mode")
+    memory_limit_mb = st.number_input("Memory ceiling (MB)", min_value=16, value=256, step=16, disabled=not streaming_mode)
+
+    # Artifacts precomputed offline with sales_engine.py replace uploading and processing altogether
+    st.header("Or load precomputed results")
+    artifact_dir = st.text_input("Artifact directory", value=os.environ.get("SALES_ARTIFACT_DIR", ""))
+    load_artifacts_clicked = st.button("Load Artifacts", disabled=not artifact_dir)
+
 
 st.header("Processed Results")
 
+# Artifacts are loaded on request, or right at startup when SALES_ARTIFACT_DIR is set
+if load_artifacts_clicked or (os.environ.get("SALES_ARTIFACT_DIR") and "sales_cube" not in st.session_state):
+    artifacts = load_artifacts(artifact_dir)
+    cube = st.session_state["sales_cube"] = artifacts["cube"]
+
+    for name, aggregated_df in artifacts["weekly"].items():
+        st.subheader(f"Weekly Aggregated Data for {name}")
+        st.dataframe(aggregated_df.style.highlight_max(axis=0, color='lightgreen'), use_container_width=True)
+
+    if artifacts["forecasts"] is not None:
+        engine = next(label for label, name in ENGINES.items() if name == artifacts["forecast_backend"])
+        full_range = (cube.min_date.date(), cube.max_date.date())
+        st.session_state["all_forecasts"] = ((full_range, artifacts["horizon"], engine), artifacts["forecasts"])
+    st.session_state["results_displayed"] = True
+
 if st.button("Process Files", key="process_files"):
     st.session_state["results_displayed"] = False
-    st.session_state["all_data"] = pd.DataFrame()
 
-    for entry in st.session_state["year_inputs"]:
+    # All selected registers are parsed concurrently (or memory-mapped from the ingestion cache)
+    uploaded = [(i, entry) for i, entry in enumerate(st.session_state["year_inputs"]) if entry["year"] and entry["file"]]
+    progress_bar = st.progress(0.0, text="Loading sales registers...")
+
+    def report_progress(done, total, index):
+        progress_bar.progress(done / total, text=f"Loaded {uploaded[index][1]['file'].name} ({done}/{total})")
+
+    try:
+        cube, weekly = load_cube(
+            [entry["file"] for _, entry in uploaded],
+            cube=st.session_state.get("sales_cube"),
+            streaming=streaming_mode,
+            memory_limit=memory_limit_mb * 1024 ** 2,
+            progress=report_progress,
+        )
+    except MemoryError as e:
+        # Streaming raises it when the memory ceiling cannot hold the cube and a minimal chunk
+        st.error(f"{e}. Raise the memory ceiling to load these registers.")
+        st.stop()
+    st.session_state["sales_cube"] = cube
+    weekly = {i: aggregated_df for (i, _), aggregated_df in zip(uploaded, weekly)}
+
+    for i, entry in enumerate(st.session_state["year_inputs"]):
         year = entry["year"]
         file = entry["file"]
 
         if year and file:
-            df, aggregated_df = process_sales_register(file)
-            st.session_state["all_data"] = pd.concat([st.session_state["all_data"], df])
+            aggregated_df = weekly[i]
             var_name = f"demand_{str(year)[-2:]}"
             st.session_state[var_name] = aggregated_df
 
@@ -81,43 +125,47 @@ if st.button("Process Files", key="process_files"):
             st.warning(f"Please upload a file for Year {year}")
 
 if st.session_state.get("results_displayed", False):
-    all_data = st.session_state["all_data"]
+    cube = st.session_state["sales_cube"]
     # Date range selection
-    min_date = all_data['Date'].min().date()
-    max_date = all_data['Date'].max().date()
+    min_date = cube.min_date.date()
+    max_date = cube.max_date.date()
     date_range = st.date_input("Select date range for analysis", 
                                value=(min_date, max_date),
                                min_value=min_date, 
                                max_value=max_date)
 
+    # Charts are decimated to month/quarter and the top products unless full resolution is requested;
+    # narrowing the date range brings back weekly detail
+    full_resolution = st.checkbox("Full resolution charts", value=False)
+
     if len(date_range) == 2:
         start_date, end_date = date_range
-        filtered_data = all_data[(all_data['Date'].dt.date >= start_date) & (all_data['Date'].dt.date <= end_date)]
-        st.session_state["filtered_data"] = filtered_data
+        st.session_state["date_range"] = (start_date, end_date)
 
         # Summary statistics
-        total_sales = filtered_data['Qty Sold'].sum()
-        avg_daily_sales = filtered_data.groupby('Date')['Qty Sold'].sum().mean()
-        top_product = filtered_data.groupby('Product')['Qty Sold'].sum().idxmax()
+        summary = summarize(cube, start_date, end_date, full_resolution=full_resolution)
+        total_sales = summary['total_sales']
+        avg_daily_sales = summary['avg_daily_sales']
+        top_product = summary['top_product']
+        product_sales = summary['product_sales']
 
         col1, col2, col3 = st.columns(3)
         col1.metric("Total Sales", f"{total_sales:,}")
         col2.metric("Avg Daily Sales", f"{avg_daily_sales:.2f}")
         col3.metric("Top Selling Product", top_product)
 
-        # Weekly sales trend
-        weekly_sales = filtered_data.groupby('Week')['Qty Sold'].sum().reset_index()
-        fig_trend = px.line(weekly_sales, x='Week', y='Qty Sold', title='Weekly Sales Trend')
+        # Sales trend
+        trend = summary['trend']
+        fig_trend = px.line(trend, x=trend.columns[0], y='Qty Sold', title=f'{period_title(trend)} Sales Trend')
         st.plotly_chart(fig_trend, use_container_width=True)
 
         # Product-wise sales
-        product_sales = filtered_data.groupby('Product')['Qty Sold'].sum().sort_values(ascending=False).reset_index()
         fig_product = px.bar(product_sales, x='Product', y='Qty Sold', title='Product-wise Sales')
         st.plotly_chart(fig_product, use_container_width=True)
 
-        # Heatmap of weekly product sales
-        pivot_data = filtered_data.pivot_table(values='Qty Sold', index='Week', columns='Product', aggfunc='sum')
-        fig_heatmap = px.imshow(pivot_data, title='Weekly Product Sales Heatmap')
+        # Heatmap of product sales over time
+        heatmap = summary['heatmap']
+        fig_heatmap = px.imshow(heatmap, title=f'{period_title(heatmap)} Product Sales Heatmap')
         st.plotly_chart(fig_heatmap, use_container_width=True)
         
         # Insights
@@ -131,33 +179,54 @@ if st.session_state.get("results_displayed", False):
         st.session_state["product_sales"] = product_sales
 
 # Product-wise demand prediction
-if "filtered_data" in st.session_state and "product_sales" in st.session_state:
+if "date_range" in st.session_state and "product_sales" in st.session_state:
     st.subheader("Product-wise Demand Prediction")
+    cube = st.session_state["sales_cube"]
+    date_range = st.session_state["date_range"]
 
+    horizon = st.slider("Forecast horizon (days):", min_value=30, max_value=730, value=365, step=30)
+    engine = st.radio("Forecasting engine:", list(ENGINES), horizontal=True)
+    backend = get_backend(ENGINES[engine])
     product_to_forecast = st.selectbox("Select a product for prediction:", 
                                        st.session_state["product_sales"]['Product'])
 
     if product_to_forecast:
-        filtered_data = st.session_state["filtered_data"]
-        product_data = filtered_data[filtered_data['Product'] == product_to_forecast]
-        product_data = product_data.groupby('Date')['Qty Sold'].sum().reset_index()
-        product_data.columns = ['ds', 'y']
-
-        # Fit Prophet model
-        model = Prophet()
-        model.fit(product_data)
-
-        # Make future dataframe
-        future = model.make_future_dataframe(periods=365)
-        forecast = model.predict(future)
-
-        # Aggregate to monthly predictions
-        forecast['Month'] = forecast['ds'].dt.to_period('M')
-        monthly_forecast = forecast.groupby('Month')['yhat'].sum().reset_index()
-        monthly_forecast.columns = ['Month', 'Predicted Demand']
-
-        # Display forecasted table
-        st.write(f"Monthly Predicted Demand for {product_to_forecast}:")
-        st.dataframe(monthly_forecast)
-
+        product_data = cube.product_daily(product_to_forecast, *date_range)
+
+        if len(product_data) < MIN_DAYS:
+            st.warning(f"{product_to_forecast} needs at least {MIN_DAYS} days of sales in the selected range to be forecast.")
+        else:
+            # Fitted Prophet models are cached per product and series, so only new data triggers a refit
+            monthly_forecast = forecast_product(product_to_forecast, product_data, periods=horizon, backend=backend)
+
+            # Display forecasted table
+            st.write(f"Monthly Predicted Demand for {product_to_forecast}:")
+            st.dataframe(monthly_forecast)
+
+    # Forecast every product at once: uncached Prophet models are fitted in a process pool,
+    # the NumPy engine fits all products in one batched solve
+    if st.button("Forecast all products"):
+        series = fittable(cube.product_series(*date_range))
+        if not series:
+            st.warning(f"No product has at least {MIN_DAYS} days of sales in the selected range; widen it to forecast.")
+        else:
+            progress_bar = st.progress(0.0, text="Fitting demand models...")
+
+            def report_progress(done, total, product):
+                progress_bar.progress(done / total, text=f"Forecast ready for {product} ({done}/{total})")
+
+            st.session_state["all_forecasts"] = (
+                (date_range, horizon, engine),
+                forecast_all(series, periods=horizon, backend=backend, progress=report_progress),
+            )
 
+    if "all_forecasts" in st.session_state and st.session_state["all_forecasts"][0] == (date_range, horizon, engine):
+        all_forecasts = st.session_state["all_forecasts"][1]
+        st.write("Monthly Predicted Demand for all products:")
+        st.dataframe(all_forecasts.pivot(index='Month', columns='Product', values='Predicted Demand'))
+        st.download_button(
+            "Export monthly forecast table",
+            data=all_forecasts.to_csv(index=False),
+            file_name="monthly_forecast.csv",
+            mime="text/csv",
+        )
@@ -0,0 +1,188 @@
+# Headless sales aggregation engine shared by both dashboards.
+# load_cube turns registers into the aggregate cube plus per-register weekly demand tables, summarize
+# derives every dashboard metric and chart input for a date range, and the artifact helpers persist
+# both (and optionally the monthly forecasts) to a directory the dashboards can load at startup.
+#
+# Usage: python sales_engine.py dummy_sales_registers/*.csv --out artifacts [--forecast fourier]
+
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from chart_lod import heatmap_data, trend_data
+from forecasting import BACKENDS, forecast_all, get_backend
+from register_cache import file_key, load_registers
+from sales_cube import MEMORY_LIMIT, SalesCube
+
+ARTIFACT_VERSION = 1
+
+
+def weekly_demand(df):
+    """Weekly 'Qty Sold' per product of one register."""
+    return df.groupby(['Week', 'Product'], observed=True)['Qty Sold'].sum().reset_index()
+
+
+def load_cube(files, cube=None, streaming=False, memory_limit=MEMORY_LIMIT, max_workers=None, progress=None):
+    """
+    Fold registers into an aggregate cube.
+
+    The cube is built once per upload set: when an existing cube is passed, registers already folded in are
+    skipped, and it is only rebuilt from scratch when one of its registers is no longer in files.
+
+    Args:
+        files (list): Paths or file-like objects holding the register CSVs.
+        cube (SalesCube): Cube built from a previous upload set, if any.
+        streaming (bool): Stream registers in chunks instead of loading them, for registers larger than memory.
+        memory_limit (int): Memory ceiling in bytes for streaming, covering the cube and the weekly tables too.
+        max_workers (int): Process pool size for parsing registers concurrently.
+        progress (callable): Called as progress(done, total, index) each time a register is ready.
+
+    Returns:
+        tuple: (cube, weekly) with weekly the per-register weekly demand tables in the order of files.
+    """
+    if streaming:
+        # Stream every register into (Date, Product) sums folded straight into the cube, so no register is ever
+        # held as a DataFrame. The cube, the sums and the weekly tables built so far all count against memory_limit.
+        keys = [file_key(file) for file in files]
+        if cube is None or not cube.keys <= set(keys):
+            cube = SalesCube()
+        weekly, held = [], 0
+        for i, (file, key) in enumerate(zip(files, keys)):
+            sums = SalesCube.read_sums(file, memory_limit, reserved=cube.nbytes + held)
+            weekly.append(SalesCube.weekly_demand_of(sums))
+            held += int(weekly[-1].memory_usage(deep=True).sum())
+            cube.add_sums(sums, key, memory_limit, reserved=held)
+            del sums
+            if progress:
+                progress(i + 1, len(files), i)
+        return cube, weekly
+
+    registers = load_registers(files, max_workers=max_workers, progress=progress)
+    weekly = [weekly_demand(df) for _, df in registers]
+    if cube is None or not cube.keys <= {key for key, _ in registers}:
+        cube = SalesCube()
+    cube.add_many(registers)
+    return cube, weekly
+
+
+def summarize(cube, start=None, end=None, full_resolution=False):
+    """
+    Every metric and chart input the dashboards show for [start, end].
+
+    Chart inputs are reduced to the viewport (see chart_lod) unless full_resolution is set.
+
+    Returns:
+        dict: total_sales, avg_daily_sales, top_product, product_sales, weekly_sales, trend, heatmap,
+            monthly_mean and sales_trend ('increasing', 'decreasing', or None for a single week).
+    """
+    weekly_sales = cube.weekly_sales(start, end)
+    sales_trend = None
+    if len(weekly_sales) > 1:
+        sales_trend = (
+            "increasing"
+            if weekly_sales['Qty Sold'].iloc[-1] > weekly_sales['Qty Sold'].iloc[0]
+            else "decreasing"
+        )
+    return {
+        'total_sales': cube.total_sales(start, end),
+        'avg_daily_sales': cube.avg_daily_sales(start, end),
+        'top_product': cube.top_product(start, end),
+        'product_sales': cube.product_sales(start, end),
+        'weekly_sales': weekly_sales,
+        'trend': trend_data(cube, start, end, full=full_resolution),
+        'heatmap': heatmap_data(cube, start, end, full=full_resolution),
+        'monthly_mean': cube.monthly_mean(start, end),
+        'sales_trend': sales_trend,
+    }
+
+
+def save_artifacts(out_dir, cube, weekly, names, forecasts=None, forecast_backend=None, horizon=None):
+    """Write the cube, the per-register weekly tables and optionally the monthly forecasts to out_dir."""
+    cube.save(out_dir)
+    registers = []
+    for i, (name, table) in enumerate(zip(names, weekly)):
+        path = f"weekly_{i}.csv"
+        table.to_csv(os.path.join(out_dir, path), index=False)
+        registers.append({'name': name, 'weekly': path})
+
+    manifest = {'version': ARTIFACT_VERSION, 'registers': registers, 'forecast': None}
+    if forecasts is not None:
+        forecasts.to_csv(os.path.join(out_dir, "monthly_forecast.csv"), index=False)
+        manifest['forecast'] = {'backend': forecast_backend, 'horizon': horizon, 'path': "monthly_forecast.csv"}
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_artifacts(out_dir):
+    """
+    Load artifacts written by save_artifacts.
+
+    Returns:
+        dict: cube, weekly (register name -> weekly table), forecasts (or None), forecast_backend and horizon.
+    """
+    with open(os.path.join(out_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest['version'] != ARTIFACT_VERSION:
+        raise ValueError(f"Unsupported artifact version {manifest['version']} in {out_dir}")
+
+    artifacts = {
+        'cube': SalesCube.load(out_dir),
+        'weekly': {
+            register['name']: pd.read_csv(os.path.join(out_dir, register['weekly']))
+            for register in manifest['registers']
+        },
+        'forecasts': None,
+        'forecast_backend': None,
+        'horizon': None,
+    }
+    if manifest['forecast']:
+        forecasts = pd.read_csv(os.path.join(out_dir, manifest['forecast']['path']))
+        forecasts['Month'] = pd.PeriodIndex(forecasts['Month'], freq='M')
+        artifacts.update(
+            forecasts=forecasts,
+            forecast_backend=manifest['forecast']['backend'],
+            horizon=manifest['forecast']['horizon'],
+        )
+    return artifacts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build sales dashboard artifacts offline")
+    parser.add_argument("registers", nargs="+", help="Sales register CSV files")
+    parser.add_argument("--out", required=True, help="Artifact directory")
+    parser.add_argument("--streaming", action="store_true", help="Stream registers in chunks (low memory)")
+    parser.add_argument("--memory-limit-mb", type=int, default=MEMORY_LIMIT // 1024 ** 2,
+                        help="Memory ceiling for streaming, in MB")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size")
+    parser.add_argument("--forecast", choices=sorted(BACKENDS), default=None,
+                        help="Also forecast every product with this backend")
+    parser.add_argument("--horizon", type=int, default=365, help="Forecast horizon in days")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cube, weekly = load_cube(
+        args.registers,
+        streaming=args.streaming,
+        memory_limit=args.memory_limit_mb * 1024 ** 2,
+        max_workers=args.workers,
+        progress=lambda done, total, i: print(f"[{done}/{total}] {args.registers[i]}"),
+    )
+    print(f"Built cube: {cube.qty.shape[0]} days x {cube.qty.shape[1]} products in {time.perf_counter() - start:.2f}s")
+
+    forecasts = None
+    if args.forecast:
+        start = time.perf_counter()
+        options = {'max_workers': args.workers} if args.forecast == "prophet" else {}
+        forecasts = forecast_all(cube.product_series(), periods=args.horizon, backend=get_backend(args.forecast, **options))
+        print(f"Forecast {forecasts['Product'].nunique()} products in {time.perf_counter() - start:.2f}s")
+
+    names = [os.path.basename(path) for path in args.registers]
+    save_artifacts(args.out, cube, weekly, names, forecasts, args.forecast, args.horizon)
+    print(f"Artifacts written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
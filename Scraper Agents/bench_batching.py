@@ -0,0 +1,48 @@
+# Benchmark of per-item vs batched multi-item summarization prompts.
+# Runs against a local mock Ollama endpoint whose cost per request is a fixed overhead (request setup and prompt
+# prefill) plus generation time per item, and which garbles a share of its multi-item replies.
+#
+# Usage: python bench_batching.py [--rows 200] [--overhead 0.2] [--item-latency 0.02]
+
+import argparse
+import threading
+import time
+
+from llm_scheduler import OLLAMA_PARALLEL, BatchScheduler, SummaryScheduler
+from stub_servers import MockOllamaHandler, mock_reply, serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched summarization prompts")
+    parser.add_argument("--rows", type=int, default=200, help="Number of descriptions to summarise")
+    parser.add_argument("--overhead", type=float, default=0.2, help="Mock per-request overhead in seconds")
+    parser.add_argument("--item-latency", type=float, default=0.02, help="Mock generation time per item in seconds")
+    args = parser.parse_args()
+
+    prompts = [
+        f"Summarise the following description in one-line: Site {i} sells {'handmade ' * (i % 7)}goods worldwide."
+        for i in range(args.rows)
+    ]
+    stats = {"calls": 0}
+    mock = serve(MockOllamaHandler, latency=args.overhead, item_latency=args.item_latency,
+                 slots=threading.Semaphore(OLLAMA_PARALLEL), garble_every=5, stats=stats)
+    with mock as host:
+        api_url = f"{host}/api/chat"
+        print(f"{args.rows} rows, {args.overhead * 1000:.0f} ms per request + {args.item_latency * 1000:.0f} ms per item,"
+              f" {OLLAMA_PARALLEL} generated at once, every 5th batch reply garbled")
+        print(f"{'mode':<22} {'time':>10} {'requests':>9} {'batches':>8} {'fallbacks':>10}")
+        for budget in (0, 512, 1024, 2048):
+            calls = stats["calls"]
+            with SummaryScheduler(api_url=api_url) as scheduler:
+                runner = BatchScheduler(scheduler, token_budget=budget) if budget else scheduler
+                start = time.perf_counter()
+                replies = runner.map(prompts)
+                elapsed = time.perf_counter() - start
+            assert replies == [mock_reply(prompt) for prompt in prompts], "replies differ"
+            name = f"batched, {budget} tokens" if budget else "per item"
+            batches = f"{runner.batches:>8} {runner.fallbacks:>10}" if budget else f"{'-':>8} {'-':>10}"
+            print(f"{name:<22} {elapsed:8.2f} s {stats['calls'] - calls:>9} {batches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Benchmark of full-page BeautifulSoup parsing vs head-only streaming meta extraction.
+# A local stand-in server returns pages with a small <head> and a large body, like the YouTube or
+# Amazon entries of web_links.csv. Reports bytes downloaded, time and peak Python memory per URL.
+#
+# Usage: python bench_meta.py [--body-kb 2048] [--urls 20]
+
+import argparse
+import time
+import tracemalloc
+
+import requests
+from bs4 import BeautifulSoup
+
+from meta_extract import extract_head_meta
+from stub_servers import serve
+
+
+def full_parse(session, url):
+    response = session.get(url, timeout=10)
+    soup = BeautifulSoup(response.text, "html.parser")
+    meta_desc = soup.find("meta", attrs={"name": "description"})
+    return soup.title.string, meta_desc["content"], len(response.content)
+
+
+def head_only(session, url):
+    return extract_head_meta(session.get(url, timeout=10, stream=True))
+
+
+def measure(fn, session, urls):
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = [fn(session, url) for url in urls]
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return results, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark meta extraction")
+    parser.add_argument("--body-kb", type=int, default=2048, help="Size of the page body in KB")
+    parser.add_argument("--urls", type=int, default=20, help="Number of pages fetched per method")
+    args = parser.parse_args()
+
+    body = "<div class='item'>" + "x" * 1000 + "</div>"
+    body *= args.body_kb * 1024 // len(body)
+    with serve(body=body) as host, requests.Session() as session:
+        urls = [f"{host}/page/{i}" for i in range(args.urls)]
+        print(f"{args.urls} pages of {args.body_kb} KB")
+        print(f"{'method':<12} {'KB/url':>10} {'ms/url':>8} {'peak MB':>8}")
+        outputs = []
+        for name, fn in (("full parse", full_parse), ("head only", head_only)):
+            results, elapsed, peak = measure(fn, session, urls)
+            outputs.append([result[:2] for result in results])
+            kb = sum(result[2] for result in results) / len(results) / 1024
+            print(f"{name:<12} {kb:>10.1f} {elapsed / len(urls) * 1000:>8.1f} {peak / 1024 ** 2:>8.1f}")
+        assert outputs[0] == outputs[1], "extractors disagree"
+
+
+if __name__ == "__main__":
+    main()
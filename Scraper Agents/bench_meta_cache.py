@@ -0,0 +1,51 @@
+# Benchmark of re-running the scraper fetch stage with and without the persistent meta cache.
+# Runs against a local stand-in server with injected latency that sends ETags and honours If-None-Match.
+#
+# Usage: python bench_meta_cache.py [--urls 200] [--latency 0.1] [--body-kb 256]
+
+import argparse
+import os
+import tempfile
+import time
+
+from meta_cache import MetaCache
+from scraper_soup_gsheets import fetch_website_data
+from stub_servers import ConditionalPageHandler, serve
+
+
+def timed_run(name, urls, cache=None):
+    start = time.perf_counter()
+    results = fetch_website_data(urls, cache=cache)
+    elapsed = time.perf_counter() - start
+    counts = f"{cache.hits:>5} {cache.revalidated:>6} {cache.misses:>6}" if cache is not None else f"{'-':>5} {'-':>6} {'-':>6}"
+    print(f"{name:<24} {elapsed:8.2f} s  {counts}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the persistent meta cache")
+    parser.add_argument("--urls", type=int, default=200, help="Number of URLs per run")
+    parser.add_argument("--latency", type=float, default=0.1, help="Injected server latency in seconds")
+    parser.add_argument("--body-kb", type=int, default=256, help="Size of the page body in KB")
+    args = parser.parse_args()
+
+    body = "x" * (args.body_kb * 1024)
+    with tempfile.TemporaryDirectory() as tmp, serve(ConditionalPageHandler, latency=args.latency, body=body) as host:
+        urls = [f"{host}/page/{i}" for i in range(args.urls)]
+        path = os.path.join(tmp, "meta.sqlite")
+        print(f"{args.urls} URLs, {args.latency * 1000:.0f} ms latency, {args.body_kb} KB pages")
+        print(f"{'run':<24} {'time':>10}  {'hits':>5} {'304':>6} {'fetch':>6}")
+        baseline = timed_run("no cache", urls)
+        with MetaCache(path) as cache:
+            cold = timed_run("cold cache", urls, cache)
+        with MetaCache(path) as cache:
+            warm = timed_run("warm cache (fresh)", urls, cache)
+        with MetaCache(path, ttl=0) as cache:
+            stale = timed_run("stale cache (304s)", urls, cache)
+        with MetaCache(path, max_entries=args.urls // 2) as cache:
+            assert len(cache) == args.urls // 2, "LRU bound not enforced"
+        assert baseline == cold == warm == stale, "cached results differ from fresh fetches"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Checks and benchmark of the per-host politeness rules of FetchEngine, against local stand-in hosts:
+#   - fairness: one slow host listed first must not hold back the fast hosts listed after it,
+#   - rate limit: requests to a host are spaced by the token bucket (measured when the client takes each token, since
+#     arrival times at the server also carry thread scheduling jitter),
+#   - Retry-After: a 429 pauses the host for the advertised time, then the request succeeds,
+#   - robots.txt: the Crawl-delay lowers the host's rate.
+#
+# Usage: python bench_politeness.py [--urls 40]
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from urllib.parse import urlsplit
+
+from fetch_engine import FetchEngine, TokenBucket, make_session
+from scraper_soup_gsheets import fetch_one
+from stub_servers import PoliteHostHandler, serve
+
+
+def fetch_unfair(urls, max_concurrency=32, per_host=4):
+    # The previous engine: a plain thread pool, with each worker blocking on its host's semaphore
+    session, hosts, lock = make_session(per_host), {}, threading.Lock()
+    done = {}
+
+    def fetch(url):
+        host = urlsplit(url).netloc
+        with lock:
+            slot = hosts.setdefault(host, threading.BoundedSemaphore(per_host))
+        with slot:
+            session.get(url, timeout=10).close()
+        done[host] = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        list(pool.map(fetch, urls))
+    return done
+
+
+def fetch_fair(urls):
+    done = {}
+
+    def fetch(engine, url):
+        engine.get(url).close()
+        done[urlsplit(url).netloc] = time.perf_counter()
+
+    with FetchEngine() as engine:
+        engine.map(fetch, urls)
+    return done
+
+
+@contextmanager
+def acquire_times():
+    # Record the moment each token-bucket acquire returns, on the client side
+    times = []
+    acquire = TokenBucket.acquire
+
+    def recording(bucket):
+        acquire(bucket)
+        times.append(time.monotonic())
+
+    TokenBucket.acquire = recording
+    try:
+        yield times
+    finally:
+        TokenBucket.acquire = acquire
+
+
+def spacing(times):
+    times = sorted(times)
+    return min(b - a for a, b in zip(times, times[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark FetchEngine politeness")
+    parser.add_argument("--urls", type=int, default=40, help="URLs per host")
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        slow = stack.enter_context(serve(PoliteHostHandler, latency=0.5))
+        fast = [stack.enter_context(serve(PoliteHostHandler, latency=0.02)) for _ in range(3)]
+        urls = [f"{host}/page/{i}" for host in [slow] + fast for i in range(args.urls)]
+        print(f"Fairness: {args.urls} URLs on a 500 ms host listed before {args.urls} URLs on each of 3 20 ms hosts")
+        for name, run in (("thread pool", fetch_unfair), ("fair engine", fetch_fair)):
+            start = time.perf_counter()
+            done = run(urls)
+            fast_done = max(done[urlsplit(host).netloc] for host in fast) - start
+            print(f"  {name:<12} fast hosts done after {fast_done:6.2f} s, all done after {time.perf_counter() - start:6.2f} s")
+
+    rate = 5
+    with serve(PoliteHostHandler) as host, FetchEngine(rate=rate) as engine, acquire_times() as times:
+        engine.map(fetch_one, [f"{host}/page/{i}" for i in range(args.urls // 2)])
+        print(f"Rate limit {rate}/s: min spacing {spacing(times) * 1000:.0f} ms between requests")
+        assert spacing(times) >= 0.9 / rate
+
+    hits = []
+    with serve(PoliteHostHandler, hits=hits, throttle_every=7, retry_after=1) as host, FetchEngine() as engine:
+        start = time.perf_counter()
+        results = engine.map(fetch_one, [f"{host}/page/{i}" for i in range(args.urls)])
+        assert all("error" not in r for r in results) and all(r["title"] != "No Title" for r in results)
+        print(f"Retry-After 1 s on every 7th request: {engine.throttled} retried, all {len(results)} fetched"
+              f" in {time.perf_counter() - start:.2f} s")
+
+    robots = "User-agent: *\nCrawl-delay: 1\n"    # The standard parser only understands whole seconds
+    with serve(PoliteHostHandler, robots=robots) as host, FetchEngine(respect_robots=True) as engine, \
+            acquire_times() as times:
+        engine.map(fetch_one, [f"{host}/page/{i}" for i in range(4)])
+        print(f"robots.txt Crawl-delay 1 s: min spacing {spacing(times) * 1000:.0f} ms between requests")
+        assert spacing(times) >= 0.9
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Benchmark of the summarization scheduler and the fetch -> summarise pipeline.
+# Runs against a local mock Ollama endpoint that generates a limited number of replies at once (like
+# OLLAMA_NUM_PARALLEL) and fails a share of requests with 503, and against stand-in page servers with latency.
+#
+# Usage: python bench_scheduler.py [--rows 120] [--parallel 4] [--llm-latency 0.1] [--page-latency 0.1]
+
+import argparse
+import threading
+import time
+
+from fetch_engine import FetchEngine
+from llm_scheduler import SummaryScheduler, pipeline
+from ollama_client import summarize
+from scraper_soup_gsheets import description_prompt, fetch_one
+from stub_servers import MockOllamaHandler, serve
+
+
+def report(name, elapsed, rows):
+    print(f"{name:<34} {elapsed:8.2f} s {rows / elapsed:8.1f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM scheduler")
+    parser.add_argument("--rows", type=int, default=120, help="Number of pages to summarise")
+    parser.add_argument("--parallel", type=int, default=4, help="Replies the mock model generates at once")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="Mock generation time in seconds")
+    parser.add_argument("--page-latency", type=float, default=0.1, help="Page server latency in seconds")
+    args = parser.parse_args()
+
+    llm = serve(MockOllamaHandler, latency=args.llm_latency, slots=threading.Semaphore(args.parallel), fail_every=25)
+    with llm as llm_host, serve(latency=args.page_latency) as page_host:
+        api_url = f"{llm_host}/api/chat"
+        urls = [f"{page_host}/page/{i}" for i in range(args.rows)]
+        prompts = [f"Summarise the following description in one-line: site {i}" for i in range(args.rows)]
+        print(f"{args.rows} rows, mock model generating {args.parallel} at once, {args.llm_latency * 1000:.0f} ms each,"
+              f" every 25th request fails")
+
+        start = time.perf_counter()
+        serial = []
+        for prompt in prompts:
+            try:
+                serial.append(summarize(prompt, api_url=api_url))
+            except Exception:
+                serial.append(summarize(prompt, api_url=api_url))
+        report("summaries, serial", time.perf_counter() - start, args.rows)
+        for workers in (2, 4, 8):
+            with SummaryScheduler(workers=workers, api_url=api_url, backoff=0.05) as scheduler:
+                start = time.perf_counter()
+                replies = scheduler.map(prompts)
+                report(f"summaries, {workers} workers ({scheduler.retried} retries)", time.perf_counter() - start, args.rows)
+            assert replies == serial, "scheduled replies differ"
+
+        with FetchEngine() as engine, SummaryScheduler(workers=args.parallel, api_url=api_url, backoff=0.05) as scheduler:
+            start = time.perf_counter()
+            pages = engine.map(fetch_one, urls)
+            staged = scheduler.map([description_prompt(page) for page in pages])
+            report("fetch all, then summarise", time.perf_counter() - start, args.rows)
+
+        with FetchEngine() as engine, SummaryScheduler(workers=args.parallel, api_url=api_url, backoff=0.05) as scheduler:
+            start = time.perf_counter()
+            records = pipeline(engine, scheduler, urls, fetch_one, description_prompt)
+            report("pipelined fetch -> summarise", time.perf_counter() - start, args.rows)
+        assert [record["summary"] for record in records] == staged, "pipelined replies differ"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Benchmark of per-row sheet.find + update_cell vs buffered batch_update write-back.
+# Runs against a local fake worksheet that counts API calls and charges a fixed latency per call, like a round
+# trip to the Sheets API (whose default quota is 60 write requests per minute per user).
+#
+# Usage: python bench_sheet_writes.py [--rows 300] [--latency 0.05]
+
+import argparse
+import re
+import time
+from types import SimpleNamespace
+
+from sheet_writer import SheetWriter
+
+
+class FakeWorksheet:
+    """In-memory stand-in for a gspread Worksheet implementing the calls the scraper makes."""
+
+    def __init__(self, links, latency):
+        self.cells = {(row, 1): link for row, link in enumerate(links, 1)}
+        self.latency = latency
+        self.calls = {}
+
+    def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        time.sleep(self.latency)
+
+    def col_values(self, col):
+        self._call("col_values")
+        rows = [row for row, c in self.cells if c == col]
+        return [self.cells.get((row, col)) for row in range(1, max(rows, default=0) + 1)]
+
+    def find(self, query):
+        self._call("find")
+        for row, col in sorted(self.cells):
+            if self.cells[row, col] == query:
+                return SimpleNamespace(row=row, col=col)
+        return None
+
+    def update_cell(self, row, col, value):
+        self._call("update_cell")
+        self.cells[row, col] = value
+
+    def batch_update(self, data):
+        self._call("batch_update")
+        for item in data:
+            start, end = item["range"].split(":")
+            col = ord(re.match(r"[A-Z]+", start).group()) - ord("A") + 1
+            first = int(re.search(r"\d+", start).group())
+            assert int(re.search(r"\d+", end).group()) == first + len(item["values"]) - 1
+            for offset, (value,) in enumerate(item["values"]):
+                self.cells[first + offset, col] = value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sheet write-back")
+    parser.add_argument("--rows", type=int, default=300, help="Number of links in the sheet")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per API call")
+    args = parser.parse_args()
+
+    links = [f"https://site{i}.example/" for i in range(args.rows)]
+    # Every 10th link has no description and is skipped, as in convert_to_one_line
+    summaries = {link: f"Summary of {link}" for i, link in enumerate(links) if i % 10}
+    print(f"{args.rows} links, {len(summaries)} summaries, {args.latency * 1000:.0f} ms per API call")
+
+    per_row = FakeWorksheet(links, args.latency)
+    start = time.perf_counter()
+    for link, summary in summaries.items():
+        per_row.update_cell(per_row.find(link).row, 2, summary)
+    print(f"{'find + update_cell':<20} {time.perf_counter() - start:8.2f} s  calls: {per_row.calls}")
+
+    batched = FakeWorksheet(links, args.latency)
+    start = time.perf_counter()
+    with SheetWriter(batched, batched.col_values(1)) as writer:
+        for link, summary in summaries.items():
+            writer.add(link, summary)
+    print(f"{'batch_update':<20} {time.perf_counter() - start:8.2f} s  calls: {batched.calls}")
+    assert batched.cells == per_row.cells, "sheets differ"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Benchmark of the summarization stage with and without the persistent summary cache.
+# Runs against a local mock Ollama endpoint with injected generation latency. Descriptions repeat across rows
+# (shared boilerplate, mirrored pages), and the warm run simulates re-running the scraper on the same list.
+#
+# Usage: python bench_summaries.py [--rows 200] [--unique 80] [--latency 0.05]
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from ollama_client import SummaryCache, summarize
+from stub_servers import MockOllamaHandler, serve
+
+
+def run(name, prompts, api_url, stats, cache=None):
+    calls = stats["calls"]
+    start = time.perf_counter()
+    replies = [summarize(prompt, cache=cache, api_url=api_url) for prompt in prompts]
+    elapsed = time.perf_counter() - start
+    rate = f"{cache.hit_rate:6.0%}" if cache is not None else f"{'-':>6}"
+    print(f"{name:<14} {elapsed:8.2f} s {stats['calls'] - calls:>8} {rate}")
+    return replies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the summary cache")
+    parser.add_argument("--rows", type=int, default=200, help="Number of rows to summarise")
+    parser.add_argument("--unique", type=int, default=80, help="Number of distinct descriptions among the rows")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock generation latency in seconds")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    prompts = [
+        f"Summarise the following description in one-line: Description of site {rng.randrange(args.unique)}."
+        for _ in range(args.rows)
+    ]
+    stats = {"calls": 0}
+    with tempfile.TemporaryDirectory() as tmp, serve(MockOllamaHandler, latency=args.latency, stats=stats) as host:
+        api_url = f"{host}/api/chat"
+        path = os.path.join(tmp, "summaries.sqlite")
+        print(f"{args.rows} rows, {len(set(prompts))} distinct prompts, {args.latency * 1000:.0f} ms per generation")
+        print(f"{'run':<14} {'time':>10} {'LLM calls':>8} {'hits':>6}")
+        baseline = run("no cache", prompts, api_url, stats)
+        with SummaryCache(path) as cache:
+            cold = run("cold cache", prompts, api_url, stats, cache)
+        with SummaryCache(path) as cache:
+            warm = run("warm cache", prompts, api_url, stats, cache)
+        assert baseline == cold == warm, "cached replies differ"
+
+
+if __name__ == "__main__":
+    main()
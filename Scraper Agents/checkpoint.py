@@ -0,0 +1,89 @@
+# Checkpoint journal for resumable scraping runs.
+# Every URL moves through fetched -> summarized -> written, and each step is appended to a JSON-lines journal
+# (flushed line by line, so a crash loses at most the step in progress). A resumed run replays the journal and
+# skips the work already done: written URLs are not touched again, summarized ones only need writing, and
+# fetched ones go straight to the model with the journaled description.
+
+import json
+import os
+import threading
+
+FETCHED, SUMMARIZED, WRITTEN = "fetched", "summarized", "written"
+STAGES = {FETCHED: 1, SUMMARIZED: 2, WRITTEN: 3}
+
+
+class Journal:
+    """Append-only JSON-lines record of per-URL progress. Thread-safe."""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.entries = {}
+        if resume and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break    # Torn last line of a crashed run
+                    self.entries.setdefault(entry["url"], {}).update(entry)
+        self._lock = threading.Lock()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def get(self, url):
+        """Latest journaled state of a URL (status plus the fields recorded with it), or None."""
+        with self._lock:
+            entry = self.entries.get(url)
+            return dict(entry) if entry is not None else None
+
+    def done(self, url, status):
+        """Whether url has reached status."""
+        entry = self.get(url)
+        return entry is not None and STAGES[entry["status"]] >= STAGES[status]
+
+    def pending(self, urls, status=WRITTEN):
+        """The urls that have not reached status yet, in order."""
+        return [url for url in urls if not self.done(url, status)]
+
+    def replay(self, urls):
+        """Records of the urls summarised but not written by an earlier run, ready to be written again."""
+        replayed = []
+        for url in urls:
+            entry = self.get(url)
+            if entry is not None and entry["status"] == SUMMARIZED:
+                replayed.append({"url": url, "summary": entry["summary"]})
+        return replayed
+
+    def record(self, url, status, **fields):
+        """Journal that url reached status, along with fields needed to resume from there."""
+        entry = {"url": url, "status": status, **fields}
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self.entries.setdefault(url, {}).update(entry)
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def journaled(fetch, journal, fields=("title", "description")):
+    """
+    Wrap fetch(engine, url) so that pages fetched by an earlier run are taken from the journal, and new ones
+    are journaled. Records carrying an "error" key are not journaled, so they are retried on resume.
+    """
+    def fetch_or_replay(engine, url):
+        entry = journal.get(url)
+        if entry is not None and all(field in entry for field in fields):
+            return {"url": url, **{field: entry[field] for field in fields}}
+        record = fetch(engine, url)
+        if "error" not in record:
+            journal.record(url, FETCHED, **{field: record.get(field) for field in fields})
+        return record
+    return fetch_or_replay
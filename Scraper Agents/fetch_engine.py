@@ -0,0 +1,275 @@
+# Concurrent, polite page fetching for the scraper agents.
+# Pages are fetched by a pool of worker threads sharing one keep-alive requests.Session, so connections to the
+# same host are pooled and reused. The pool size caps the total number of requests in flight, and per host:
+#   - at most per_host requests run at once,
+#   - a token bucket caps the request rate (optionally lowered to the robots.txt Crawl-delay),
+#   - a 429/503 answer with Retry-After pauses the host for that long before the request is retried.
+# Submitted work is queued per host and workers pick hosts round-robin, skipping hosts that are saturated,
+# rate-limited or paused, so one slow or throttling host never ties up the workers other hosts could use.
+# Results of map() always come back in the order of the input URLs.
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import registry
+
+MAX_CONCURRENCY = 32    # Requests in flight overall
+PER_HOST_CONCURRENCY = 4    # Requests in flight against a single host
+RATE_PER_HOST = None    # Requests per second against a single host; None for no limit
+TIMEOUT = 10
+THROTTLE_RETRIES = 2    # Retries of a request answered with 429/503
+THROTTLE_STATUS = {429, 503}
+DEFAULT_RETRY_AFTER = 1.0    # Pause after a 429/503 without a usable Retry-After header, doubled per retry
+MAX_RETRY_AFTER = 120.0
+USER_AGENT = "*"
+
+
+def make_session(pool_size=PER_HOST_CONCURRENCY):
+    """A requests session whose connection pools keep pool_size keep-alive connections per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=100, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def retry_after(value, now=None):
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date), or None when unusable."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (now or time.time()))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Rate limiter holding up to burst tokens, refilled at rate tokens per second; rate None means unlimited."""
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.paused_until = 0.0
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def _wait(self, now):
+        # Seconds until a token can be taken
+        wait = self.paused_until - now
+        if self.rate is not None and self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def delay(self):
+        """Seconds until a token will be available; 0 when one is available now."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return max(0.0, self._wait(now))
+
+    def acquire(self):
+        """Take a token, sleeping until one is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait(now)
+                if wait <= 0:
+                    if self.rate is not None:
+                        self.tokens -= 1
+                    return
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hand out no token for the next seconds (e.g. after a Retry-After)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def slow_down(self, rate):
+        """Lower the rate to at most rate tokens per second, without bursts."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate if self.rate is None else min(self.rate, rate)
+            self.burst = 1
+            self.tokens = min(self.tokens, 1.0)
+
+
+class _Host:
+    def __init__(self, per_host, rate):
+        self.slot = threading.BoundedSemaphore(per_host)
+        self.bucket = TokenBucket(rate)
+        self.queue = deque()
+        self.active = 0    # Jobs of this host currently running on a worker
+        self.robots_lock = threading.Lock()
+        self.robots_checked = False
+
+
+class FetchEngine:
+    """Fetches URLs concurrently under global and per-host concurrency and rate limits."""
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, per_host=PER_HOST_CONCURRENCY, timeout=TIMEOUT, session=None,
+                 rate=RATE_PER_HOST, respect_robots=False, retries=THROTTLE_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.rate = rate
+        self.respect_robots = respect_robots
+        self.retries = retries
+        self.session = session or make_session(per_host)
+        self.throttled = 0    # Requests answered with 429/503 and retried
+        self._hosts = {}
+        self._ring = deque()    # Hosts with queued jobs, in round-robin order
+        self._cond = threading.Condition()
+        self._workers = []
+        self._closed = False
+
+    def _host(self, url):
+        # Called with self._cond held
+        name = urlsplit(url).netloc.lower()
+        if name not in self._hosts:
+            self._hosts[name] = _Host(self.per_host, self.rate)
+        return self._hosts[name]
+
+    def _check_robots(self, url, host):
+        with host.robots_lock:
+            if host.robots_checked:
+                return
+            host.robots_checked = True
+            parts = urlsplit(url)
+            try:
+                response = self.session.get(f"{parts.scheme}://{parts.netloc}/robots.txt", timeout=self.timeout)
+                if response.status_code != 200:
+                    return
+                robots = RobotFileParser()
+                robots.parse(response.text.splitlines())
+                robots.modified()    # crawl_delay() answers None for a parser that never "read" the file
+                delay = robots.crawl_delay(USER_AGENT)
+            except (requests.RequestException, ValueError):
+                return
+            if delay:
+                host.bucket.slow_down(1 / float(delay))
+
+    def get(self, url, **kwargs):
+        """
+        GET a URL through the pooled session, within its host's concurrency and rate limits.
+        A 429/503 answer pauses the host for its Retry-After and the request is retried, up to retries times.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        with self._cond:
+            host = self._host(url)
+        if self.respect_robots:
+            self._check_robots(url, host)
+        for attempt in range(self.retries + 1):
+            with host.slot:
+                host.bucket.acquire()
+                response = self.session.get(url, **kwargs)
+            if response.status_code not in THROTTLE_STATUS or attempt == self.retries:
+                break
+            delay = retry_after(response.headers.get("Retry-After"))
+            response.close()
+            host.bucket.pause(min(MAX_RETRY_AFTER, delay if delay is not None else DEFAULT_RETRY_AFTER * 2 ** attempt))
+            with self._cond:
+                self.throttled += 1
+            registry.count("fetch_throttled_total", host=urlsplit(url).netloc)
+        return response
+
+    def submit(self, fn, url):
+        """
+        Queue fn(engine, url) behind the other work for the URL's host.
+
+        Returns:
+            concurrent.futures.Future: Future of the result of fn.
+        """
+        future = Future()
+        with self._cond:
+            host = self._host(url)
+            if not host.queue:
+                self._ring.append(host)
+            host.queue.append((fn, url, future))
+            if len(self._workers) < self.max_concurrency:
+                worker = threading.Thread(target=self._work, daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._cond.notify()
+        return future
+
+    def _next_job(self):
+        # Called with self._cond held. Round-robin over the hosts with queued work, skipping the ones
+        # already running per_host jobs or waiting for a token; sleeps until one of them can go.
+        while True:
+            if not self._ring and self._closed:
+                return None
+            wake = None
+            for _ in range(len(self._ring)):
+                host = self._ring[0]
+                self._ring.rotate(-1)
+                if host.active >= self.per_host:
+                    continue
+                delay = host.bucket.delay()
+                if delay > 0:
+                    wake = delay if wake is None else min(wake, delay)
+                    continue
+                job = host.queue.popleft()
+                if not host.queue:
+                    self._ring.remove(host)
+                host.active += 1
+                return host, job
+            self._cond.wait(wake)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                item = self._next_job()
+            if item is None:
+                return
+            host, (fn, url, future) = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(self, url))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._cond:
+                host.active -= 1
+                self._cond.notify_all()
+
+    def map(self, fn, urls):
+        """
+        Call fn(engine, url) for every URL concurrently.
+
+        Returns:
+            list: The results of fn, in the order of urls.
+        """
+        return [future.result() for future in [self.submit(fn, url) for url in urls]]
+
+    def close(self):
+        """Finish the queued work, stop the workers and close the session."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
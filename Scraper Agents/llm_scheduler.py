@@ -0,0 +1,312 @@
+# Bounded, concurrent scheduling of Ollama summarization requests.
+# A fixed pool of workers, sized to the number of requests Ollama serves in parallel (OLLAMA_NUM_PARALLEL),
+# posts prompts over one keep-alive session, so the model is never idle while the client parses a reply and
+# excess requests wait client-side instead of queueing inside Ollama. Timeouts, dropped connections, 429s and
+# 5xx replies are retried with exponential backoff and jitter. A prompt submitted while an identical one is still in
+# flight shares its future, so duplicates reach the model once even before the first reply is cached.
+# BatchScheduler packs several prompts into one numbered multi-item prompt, sized by a token budget, to amortize
+# the per-request overhead and prefill cost; a reply that does not parse back into one line per item falls back
+# to per-item requests.
+# pipeline() chains page fetching (the producer) to summarization (the consumer): each page is handed to
+# the scheduler the moment its <head> arrives, so fetching and generation overlap; iter_pipeline() streams the
+# finished records so results can be written out while later pages are still in flight.
+
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+from fetch_engine import make_session
+from metrics import registry
+from ollama_client import MODEL_NAME, OLLAMA_API_URL, TIMEOUT, prompt_key, summarize
+
+OLLAMA_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))
+RETRIES = 3
+BACKOFF = 1.0    # Seconds before the first retry, doubled on every further attempt
+MAX_BACKOFF = 30.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+CONTEXT_TOKENS = int(os.environ.get("OLLAMA_NUM_CTX", 2048))    # Prompt and reply must fit the model context
+SUMMARY_TOKENS = 48    # Reply tokens reserved per item of a batch
+MAX_BATCH = 16
+BATCH_HEADER = (
+    "Answer each of the following {n} numbered requests with one line. Reply with exactly {n} lines, numbered "
+    "1. to {n}. in the same order, and nothing else.\n\n"
+)
+NUMBERED_LINE = re.compile(r"^\s*(\d+)[.):]\s*(.+?)\s*$")
+
+
+def _retryable(error):
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+    return isinstance(error, requests.HTTPError) and error.response is not None and \
+        error.response.status_code in RETRY_STATUS
+
+
+class SummaryScheduler:
+    """Runs summarize() calls on a bounded worker pool with retries."""
+
+    def __init__(self, workers=OLLAMA_PARALLEL, cache=None, model=MODEL_NAME, api_url=OLLAMA_API_URL,
+                 timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+        self.workers = workers
+        self.cache = cache
+        self.model = model
+        self.api_url = api_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.retried = self.deduplicated = 0
+        self.session = make_session(workers)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._inflight = {}    # prompt_key -> Future of the memoized prompts not answered yet
+        self._lock = threading.Lock()
+
+    def _call(self, prompt, memoize):
+        for attempt in range(self.retries + 1):
+            try:
+                return summarize(prompt, cache=self.cache if memoize else None, model=self.model,
+                                 api_url=self.api_url, timeout=self.timeout, session=self.session)
+            except requests.RequestException as e:
+                if attempt == self.retries or not _retryable(e):
+                    raise
+                self.retried += 1
+                registry.count("llm_retries_total")
+                time.sleep(random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt)))
+
+    def submit(self, prompt, memoize=True):
+        """
+        Queue a prompt.
+
+        Args:
+            prompt (str): User message.
+            memoize (bool): Look the reply up in, and store it to, the summary cache.
+
+        Returns:
+            concurrent.futures.Future: Future of the reply, shared with an identical memoized prompt in flight.
+        """
+        if not memoize:
+            return self._pool.submit(self._call, prompt, memoize)
+        key = prompt_key(self.model, prompt)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                return future
+            future = self._inflight[key] = self._pool.submit(self._call, prompt, memoize)
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        # The reply is in the cache by now; later submitters look it up there
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def flush(self):
+        """Prompts are sent as soon as they are submitted; nothing is held back."""
+
+    def map(self, prompts):
+        """Replies to prompts, in order."""
+        futures = [self.submit(prompt) for prompt in prompts]
+        self.flush()
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._pool.shutdown()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def estimate_tokens(text):
+    """Rough token count of English text (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def batch_prompt(prompts):
+    """One numbered prompt asking for a one-line reply to each of prompts."""
+    items = "\n".join(f"{i}. {' '.join(prompt.split())}" for i, prompt in enumerate(prompts, 1))
+    return BATCH_HEADER.format(n=len(prompts)) + items
+
+
+def parse_batch(reply, n):
+    """
+    Split the reply to a batch_prompt of n items.
+
+    Returns:
+        list or None: The n replies in order, or None when the reply does not number every item exactly once.
+    """
+    lines = {}
+    for line in reply.splitlines():
+        match = NUMBERED_LINE.match(line)
+        if match:
+            index = int(match.group(1))
+            if index in lines or not 1 <= index <= n:
+                return None
+            lines[index] = match.group(2)
+    if len(lines) != n:
+        return None
+    return [lines[i] for i in range(1, n + 1)]
+
+
+def _chain(source, target, transform=lambda result: result):
+    def copy(done):
+        try:
+            target.set_result(transform(done.result()))
+        except Exception as e:
+            target.set_exception(e)
+    source.add_done_callback(copy)
+
+
+class BatchScheduler:
+    """
+    Groups submitted prompts into multi-item batches sent through a SummaryScheduler.
+
+    A batch is sent once its items would overflow the token budget or reach max_items, and on flush().
+    Each item is memoized on its own, under its own prompt, so cached items never enter a batch and
+    later runs hit the cache whether or not they batch. A prompt already waiting for a batch or in flight
+    shares the future of the first one, so a batch never holds the same item twice.
+    """
+
+    def __init__(self, scheduler, token_budget=CONTEXT_TOKENS, max_items=MAX_BATCH):
+        self.scheduler = scheduler
+        self.token_budget = token_budget
+        self.max_items = max_items
+        self.batches = self.fallbacks = self.deduplicated = 0
+        self._pending = []
+        self._inflight = {}    # prompt_key -> Future of the prompts pending or in flight
+        self._tokens = estimate_tokens(BATCH_HEADER)
+        self._lock = threading.RLock()    # Reentrant: a future can complete, and be forgotten, inside submit
+
+    def submit(self, prompt):
+        """
+        Queue a prompt for the next batch.
+
+        Returns:
+            concurrent.futures.Future: Future of the reply.
+        """
+        key = prompt_key(self.scheduler.model, prompt)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                return future
+        future = Future()
+        cache = self.scheduler.cache
+        reply = cache.get(self.scheduler.model, prompt) if cache is not None else None
+        if reply is not None:
+            future.set_result(reply)
+            return future
+        cost = estimate_tokens(prompt) + SUMMARY_TOKENS
+        with self._lock:
+            if key in self._inflight:    # Submitted by another thread since the check above
+                self.deduplicated += 1
+                return self._inflight[key]
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+            if self._pending and (self._tokens + cost > self.token_budget or len(self._pending) >= self.max_items):
+                self._send(self._take())
+            self._pending.append((prompt, future))
+            self._tokens += cost
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        self._tokens = estimate_tokens(BATCH_HEADER)
+        return batch
+
+    def flush(self):
+        """Send the prompts still waiting for a batch."""
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch):
+        if len(batch) == 1:
+            prompt, future = batch[0]
+            _chain(self.scheduler.submit(prompt), future)
+            return
+        self.batches += 1
+        reply = self.scheduler.submit(batch_prompt([prompt for prompt, _ in batch]), memoize=False)
+        reply.add_done_callback(lambda done: self._unpack(batch, done))
+
+    def _unpack(self, batch, done):
+        replies = parse_batch(done.result(), len(batch)) if done.exception() is None else None
+        if replies is None:
+            # Unparseable reply or failed request: ask for every item on its own
+            self.fallbacks += 1
+            registry.count("llm_batch_fallbacks_total")
+            for prompt, future in batch:
+                _chain(self.scheduler.submit(prompt), future)
+            return
+        cache = self.scheduler.cache
+        for (prompt, future), reply in zip(batch, replies):
+            if cache is not None:
+                cache.put(self.scheduler.model, prompt, reply)
+            future.set_result(reply)
+
+    def map(self, prompts):
+        """Replies to prompts, in order."""
+        futures = [self.submit(prompt) for prompt in prompts]
+        self.flush()
+        return [future.result() for future in futures]
+
+
+def iter_pipeline(engine, scheduler, urls, fetch, make_prompt):
+    """
+    Fetch pages and summarise each one as soon as it has been fetched, yielding records as they complete.
+
+    Args:
+        engine (FetchEngine): Engine the pages are fetched on.
+        scheduler (SummaryScheduler or BatchScheduler): Scheduler the prompts are sent to.
+        urls (iterable): Page URLs.
+        fetch (callable): fetch(engine, url) -> dict describing the page.
+        make_prompt (callable): make_prompt(record) -> prompt, or None to skip the page.
+
+    Yields:
+        dict: The records, in the order of urls. Summarised records carry a "summary" key, or a
+        "summary_error" key when the model could not be reached.
+    """
+    urls = list(urls)
+    remaining = [len(urls)]
+    lock = threading.Lock()
+
+    def produce(engine, url):
+        try:
+            record = fetch(engine, url)
+            prompt = make_prompt(record)
+            return record, scheduler.submit(prompt) if prompt else None
+        finally:
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                scheduler.flush()    # Send the last partial batch once every page has been fetched
+
+    for item in [engine.submit(produce, url) for url in urls]:
+        record, future = item.result()
+        if future is not None:
+            try:
+                record["summary"] = future.result()
+            except Exception as e:
+                registry.error("summarize", e)
+                record["summary_error"] = str(e)
+        yield record
+
+
+def pipeline(engine, scheduler, urls, fetch, make_prompt):
+    """Like iter_pipeline, but returns the list of all records once every page has been summarised."""
+    return list(iter_pipeline(engine, scheduler, urls, fetch, make_prompt))
@@ -0,0 +1,133 @@
+# Persistent cache of page titles and descriptions for the scraper agents.
+# Entries live in a SQLite file keyed by normalized URL, together with the ETag / Last-Modified validators
+# the server sent. Entries younger than the TTL are served without touching the network. Older entries are
+# revalidated with a conditional GET, and a 304 Not Modified refreshes them without downloading the page.
+# The cache is bounded: past max_entries, the least recently used URLs are evicted.
+
+import os
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from meta_extract import extract_head_meta
+from metrics import registry
+from sqlite_cache import SQLiteCache
+
+CACHE_PATH = os.environ.get(
+    "SCRAPER_META_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".meta_cache.sqlite"),
+)
+TTL = 24 * 3600    # Seconds an entry is trusted without revalidation
+MAX_ENTRIES = 10_000
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """Canonical form of a URL used as the cache key: lower-case scheme and host, no default port or fragment, sorted query."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class MetaCache(SQLiteCache):
+    """SQLite-backed title/description cache with TTL, conditional revalidation and LRU eviction. Thread-safe."""
+
+    table = "meta"
+    key_column = "url"
+    columns = "title TEXT, description TEXT, etag TEXT, last_modified TEXT, fetched_at REAL, accessed_at REAL"
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.hits = self.revalidated = self.misses = 0
+        super().__init__(path, max_entries)
+
+    def get(self, url):
+        """
+        Look up a URL.
+
+        Returns:
+            dict or None: Entry with title, description, etag, last_modified and fresh (younger than the TTL).
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT title, description, etag, last_modified, fetched_at FROM meta WHERE url = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(key, now)
+        title, description, etag, last_modified, fetched_at = row
+        return {
+            "title": title,
+            "description": description,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh": now - fetched_at < self.ttl,
+        }
+
+    def put(self, url, title, description, etag=None, last_modified=None):
+        """Store (or replace) the entry of a URL and evict the least recently used entries past max_entries."""
+        now = time.time()
+        self._store((normalize_url(url), title, description, etag, last_modified, now, now))
+
+    def refresh(self, url):
+        """Mark an entry as just revalidated (after a 304)."""
+        with self._lock:
+            self._db.execute("UPDATE meta SET fetched_at = ? WHERE url = ?", (time.time(), normalize_url(url)))
+            self._db.commit()
+
+    def record(self, outcome):
+        """Count a lookup outcome: "hits", "revalidated" or "misses"."""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+
+def fetch_meta(engine, url, cache=None):
+    """
+    Title and description of a page, served from the cache when possible.
+
+    Args:
+        engine (FetchEngine): Engine used for network requests.
+        url (str): Page URL.
+        cache (MetaCache): Optional cache; without it every call fetches the page head.
+
+    Returns:
+        tuple: (title, description); either may be None when the page lacks it.
+    """
+    entry = cache.get(url) if cache is not None else None
+    if entry is not None and entry["fresh"]:
+        cache.record("hits")
+        registry.count("meta_cache_total", outcome="hit")
+        return entry["title"], entry["description"]
+
+    headers = {}
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+    with registry.timer("fetch"):
+        response = engine.get(url, stream=True, headers=headers)
+    if entry is not None and response.status_code == 304:
+        response.close()
+        cache.refresh(url)
+        cache.record("revalidated")
+        registry.count("meta_cache_total", outcome="revalidated")
+        return entry["title"], entry["description"]
+
+    etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+    with registry.timer("parse"):
+        title, description, bytes_read = extract_head_meta(response)
+    registry.count("bytes_downloaded_total", bytes_read)
+    if not response.ok:
+        registry.count("errors_total", stage="fetch", type=f"HTTP {response.status_code}")
+    if cache is not None:
+        cache.record("misses")
+        registry.count("meta_cache_total", outcome="miss")
+        if response.ok:    # Error pages are never cached
+            cache.put(url, title, description, etag, last_modified)
+    return title, description
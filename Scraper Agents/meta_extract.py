@@ -0,0 +1,76 @@
+# Streaming extraction of the page title and meta description.
+# Only the <head> of a page is needed, so the response is read incrementally and fed to an incremental
+# HTML parser that stops at </head> (or <body>). Reading also stops at a byte cap, and the rest of the
+# body is never downloaded. Heavy pages therefore cost a few kilobytes instead of megabytes, and no
+# full parse tree is ever built.
+
+import codecs
+from html.parser import HTMLParser
+
+HEAD_BYTE_CAP = 256 * 1024    # Stop reading after this many bytes even if </head> was not seen
+CHUNK_SIZE = 8 * 1024
+
+
+class HeadMetaParser(HTMLParser):
+    """Collects <title> and <meta name="description"> until the end of the head."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.description = None
+        self.done = False
+        self._in_title = False
+        self._title_parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title" and self.title is None:
+            self._in_title = True
+        elif tag == "meta" and self.description is None:
+            attrs = dict(attrs)
+            if (attrs.get("name") or "").lower() == "description":
+                self.description = attrs.get("content") or ""
+        elif tag == "body":
+            self.done = True
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.title = "".join(self._title_parts)
+        elif tag == "head":
+            self.done = True
+
+
+def extract_head_meta(response, max_bytes=HEAD_BYTE_CAP, chunk_size=CHUNK_SIZE):
+    """
+    Read a streamed response (requests.get(..., stream=True)) only as far as the end of its <head>.
+
+    Args:
+        response (requests.Response): Response opened with stream=True.
+        max_bytes (int): Maximum number of body bytes to read.
+        chunk_size (int): Bytes read per iteration.
+
+    Returns:
+        tuple: (title, description, bytes_read); title and description are None when missing.
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    parser = HeadMetaParser()
+    bytes_read = 0
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            bytes_read += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done or bytes_read >= max_bytes:
+                break
+    finally:
+        # Drops the connection instead of draining the unread body
+        response.close()
+    if parser._in_title:
+        parser.title = "".join(parser._title_parts)
+    return parser.title, parser.description, bytes_read
@@ -0,0 +1,188 @@
+# Lightweight run metrics for the scraper pipeline (fetch -> parse -> summarize -> write).
+# The modules of the pipeline record into the process-wide `registry`: latency histograms per stage, counters
+# (bytes downloaded, cache outcomes, LLM tokens, errors by stage and type). A run ends with registry.report(),
+# and registry.export(path) writes everything as JSON or, for any other extension, as Prometheus text.
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is unbounded
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+
+class Histogram:
+    """Bucketed distribution of observed values, with count, sum and max."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate of the q-quantile, interpolated linearly inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = min(self.buckets[i], self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of counters and histograms, identified by name and labels."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def count(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the block into the stage_seconds histogram of stage, counting the exceptions it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(stage, e)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage)
+
+    def error(self, stage, error):
+        self.count("errors_total", stage=stage, type=type(error).__name__)
+
+    def value(self, name, **labels):
+        with self._lock:
+            return self.counters.get(_key(name, labels), 0)
+
+    def total(self, name):
+        """Sum of a counter over all its labels."""
+        with self._lock:
+            return sum(v for (n, _), v in self.counters.items() if n == name)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """All metrics as plain data."""
+        with self._lock:
+            return {
+                "elapsed_seconds": time.time() - self.started,
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self.counters.items())],
+                "histograms": [
+                    {
+                        "name": n, "labels": dict(l), "count": h.count, "sum": h.sum, "max": h.max,
+                        "p50": h.quantile(0.5), "p95": h.quantile(0.95),
+                        "buckets": {str(b): c for b, c in zip(h.buckets, h.counts)},
+                    }
+                    for (n, l), h in sorted(self.histograms.items())
+                ],
+            }
+
+    def report(self):
+        """Human-readable summary of the run."""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+
+        def total(name):
+            return sum(v for (n, _), v in counters.items() if n == name)
+
+        lines = [f"Run time {time.time() - self.started:.1f} s"]
+        stages = sorted((dict(l).get("stage", ""), h) for (n, l), h in histograms.items() if n == "stage_seconds")
+        for stage, h in stages:
+            lines.append(
+                f"  {stage:<10} {h.count:>7} calls  total {h.sum:8.2f} s  p50 {h.quantile(0.5) * 1000:8.1f} ms"
+                f"  p95 {h.quantile(0.95) * 1000:8.1f} ms  max {h.max * 1000:8.1f} ms"
+            )
+        lines.append(f"  downloaded {total('bytes_downloaded_total') / 1024:.1f} KB")
+        for cache in ("meta_cache", "summary_cache"):
+            outcomes = {dict(l)["outcome"]: v for (n, l), v in counters.items() if n == f"{cache}_total"}
+            lookups = sum(outcomes.values())
+            if lookups:
+                hits = outcomes.get("hit", 0) + outcomes.get("revalidated", 0)
+                detail = ", ".join(f"{k} {v}" for k, v in sorted(outcomes.items()))
+                lines.append(f"  {cache.replace('_', ' ')} hit rate {hits / lookups:.0%} ({detail})")
+        tokens, eval_seconds = total("llm_tokens_total"), total("llm_eval_seconds_total")
+        if eval_seconds:
+            lines.append(f"  LLM {tokens} tokens generated, {tokens / eval_seconds:.1f} tokens/s per request")
+        retries, throttled = total("llm_retries_total"), total("fetch_throttled_total")
+        if retries or throttled:
+            lines.append(f"  retries {retries} LLM requests, {throttled} throttled fetches")
+        for (n, l), v in sorted(counters.items()):
+            if n == "errors_total":
+                labels = dict(l)
+                lines.append(f"  errors {labels['stage']}/{labels['type']}: {v}")
+        return "\n".join(lines)
+
+    def to_prometheus(self, prefix="scraper_"):
+        """All metrics in the Prometheus text exposition format."""
+        out = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                out.append(f"{prefix}{name}{_labels(labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    out.append(f"{prefix}{name}_bucket{_labels(labels, [('le', le)])} {cumulative}")
+                out.append(f"{prefix}{name}_sum{_labels(labels)} {h.sum}")
+                out.append(f"{prefix}{name}_count{_labels(labels)} {h.count}")
+        return "\n".join(out) + "\n"
+
+    def export(self, path):
+        """Write the metrics to path: JSON for a .json file, Prometheus text otherwise."""
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+
+registry = Metrics()
@@ -0,0 +1,122 @@
+# Ollama chat client shared by the scraper agents, with a persistent memoization cache.
+# Summaries are stored in a SQLite file keyed by the SHA-256 of (model, prompt), so an identical prompt,
+# whether it repeats across rows or across runs, reaches the model only once. The cache is bounded: past
+# max_entries, the least recently used prompts are evicted.
+
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+from metrics import registry
+from sqlite_cache import SQLiteCache
+
+OLLAMA_API_URL = "http://127.0.0.1:11434/api/chat"
+MODEL_NAME = "mistral"
+TIMEOUT = 120
+CACHE_PATH = os.environ.get(
+    "SCRAPER_SUMMARY_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".summary_cache.sqlite"),
+)
+MAX_ENTRIES = 50_000
+
+
+def chat(prompt, model=MODEL_NAME, api_url=OLLAMA_API_URL, timeout=TIMEOUT, session=None):
+    """
+    Send one user message to Ollama and return the streamed reply.
+
+    Args:
+        prompt (str): User message.
+        model (str): Ollama model name.
+        api_url (str): URL of the /api/chat endpoint.
+        timeout (float): Request timeout in seconds.
+        session (requests.Session): Optional session to reuse connections.
+
+    Returns:
+        str: The reply, stripped.
+    """
+    payload = {"model": model, "messages": [{"role": "user", "content": prompt}]}
+    start = time.perf_counter()
+    with registry.timer("summarize"):
+        response = (session or requests).post(api_url, json=payload, stream=True, timeout=timeout)
+        response.raise_for_status()
+        parts = []
+        stats = {}
+        for chunk in response.iter_lines():
+            if chunk:
+                try:
+                    message = json.loads(chunk)
+                except json.JSONDecodeError:
+                    print(f"Non-JSON chunk: {chunk.decode('utf-8')}")
+                    continue
+                parts.append(message.get("message", {}).get("content", ""))
+                if message.get("done"):
+                    stats = message
+    # The final chunk reports the generated tokens and generation time; count chunks and wall time without it
+    registry.count("llm_tokens_total", stats.get("eval_count", len(parts)))
+    registry.count("llm_eval_seconds_total", stats.get("eval_duration", 0) / 1e9 or time.perf_counter() - start)
+    return "".join(parts).strip()
+
+
+def prompt_key(model, prompt):
+    """Cache key of a prompt sent to a model."""
+    return hashlib.sha256(f"{model}\0{prompt}".encode()).hexdigest()
+
+
+class SummaryCache(SQLiteCache):
+    """SQLite-backed memo of model replies keyed by (model, prompt hash), with LRU eviction. Thread-safe."""
+
+    table = "summaries"
+    columns = "model TEXT, reply TEXT, accessed_at REAL"
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.hits = self.misses = 0
+        super().__init__(path, max_entries)
+
+    def get(self, model, prompt):
+        """Return the cached reply of a prompt, or None, and count the hit or miss."""
+        key = prompt_key(model, prompt)
+        with self._lock:
+            row = self._db.execute("SELECT reply FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                registry.count("summary_cache_total", outcome="miss")
+                return None
+            self.hits += 1
+            registry.count("summary_cache_total", outcome="hit")
+            self._touch(key)
+        return row[0]
+
+    def put(self, model, prompt, reply):
+        self._store((prompt_key(model, prompt), model, reply, time.time()))
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def summarize(prompt, cache=None, model=MODEL_NAME, api_url=OLLAMA_API_URL, **kwargs):
+    """
+    Reply of the model to a prompt, memoized in cache when one is given. Empty replies are not cached.
+
+    Args:
+        prompt (str): User message.
+        cache (SummaryCache): Optional memoization cache.
+        model (str): Ollama model name.
+        api_url (str): URL of the /api/chat endpoint.
+        kwargs: Passed on to chat().
+
+    Returns:
+        str: The reply, stripped.
+    """
+    if cache is not None:
+        reply = cache.get(model, prompt)
+        if reply is not None:
+            return reply
+    reply = chat(prompt, model=model, api_url=api_url, **kwargs)
+    if cache is not None and reply:
+        cache.put(model, prompt, reply)
+    return reply
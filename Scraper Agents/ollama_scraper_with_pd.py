@@ -1,47 +1,85 @@
+import argparse
+import itertools
+
 import pandas as pd
-import requests
-import json
+
+from checkpoint import SUMMARIZED, WRITTEN, Journal, journaled
+from fetch_engine import FetchEngine
+from llm_scheduler import BatchScheduler, SummaryScheduler, iter_pipeline
+from meta_cache import MetaCache, fetch_meta
+from metrics import registry
+from ollama_client import SummaryCache
+from sheet_writer import CsvWriter
+
+CSV_PATH = "web_links.csv"
+JOURNAL_PATH = "web_links.journal.jsonl"    # Per-URL progress, for --resume (see checkpoint.py)
+FLUSH_EVERY = 20    # Summaries written to the CSV at a time
+RATE_PER_HOST = 5    # Requests per second to any one site, lowered further by its robots.txt Crawl-delay
+
+parser = argparse.ArgumentParser(description=f"Summarise the links of {CSV_PATH} into its Description column")
+parser.add_argument("--resume", action="store_true", help=f"Skip the work {JOURNAL_PATH} records as done")
+parser.add_argument("--metrics", metavar="PATH", help="Export the run metrics to PATH (.json, or Prometheus text)")
+args = parser.parse_args()
 
 # Load the CSV file
-web_links = pd.read_csv("web_links.csv")
+web_links = pd.read_csv(CSV_PATH)
 
-# Ensure all URLs start with 'https://' or 'http://'
-web_links['URL'] = web_links['URL'].apply(lambda x: f"https://{x}" if not x.startswith(("http://", "https://")) else x)
+# Ensure all URLs start with 'https://' or 'http://' (the URL column itself is written back unchanged)
+links = web_links['URL'].apply(lambda x: f"https://{x}" if not x.startswith(("http://", "https://")) else x).tolist()
 
 # Define the Ollama API configuration
 OLLAMA_API_URL = "http://127.0.0.1:11434/api/chat"
 MODEL_NAME = "mistral"
+BATCH_PROMPTS = True    # Pack several prompts into each Ollama request (see llm_scheduler.BatchScheduler)
 
-# Loop through each URL and send requests to Ollama
-for link in web_links['URL']:
+# Fetch the meta description of a page; unchanged pages come from the on-disk cache (see meta_cache.py)
+def fetch_page(engine, link, cache):
     try:
-        # Define the prompt
-        prompt = f"Extract the description of the website {link} only. Then, summarise it concisely in one line. Output the summary only."
-        
-        # Create the payload
-        payload = {
-            "model": MODEL_NAME,
-            "messages": [{"role": "user", "content": prompt}],
-        }
-
-        # Send the request to Ollama
-        response = requests.post(OLLAMA_API_URL, json=payload, stream=True, timeout=120)
-
-        # Accumulate response chunks
-        full_response = ""
-        for chunk in response.iter_lines():
-            if chunk:
-                try:
-                    data = json.loads(chunk)
-                    full_response += data.get("message", {}).get("content", "")
-                except json.JSONDecodeError:
-                    print(f"Non-JSON chunk: {chunk.decode('utf-8')}")
-        
-        # Print the reconstructed response
-        print(f"Website: {link}")
-        print(f"Summary: {full_response.strip()}")
-        print("-" * 50)
-
+        return {"url": link, "description": fetch_meta(engine, link, cache)[1]}
     except Exception as e:
-        # Handle errors (e.g., timeout, invalid response)
-        print(f"Error processing {link}: {e}")
+        print(f"Could not fetch {link}: {e}")
+        return {"url": link, "description": None, "error": str(e)}
+
+# Define the prompt
+def make_prompt(page):
+    if page["description"]:
+        return f"The website {page['url']} describes itself as: {page['description']}. Summarise it concisely in one line. Output the summary only."
+    return f"Extract the description of the website {page['url']} only. Then, summarise it concisely in one line. Output the summary only."
+
+# Fetch every page and send its prompt to Ollama as soon as the page arrives. Requests to Ollama run on a bounded pool
+# with retries and several prompts are packed into each request (see llm_scheduler.py); replies are memoized on disk
+# (see ollama_client.py). Summaries are saved into the Description column every FLUSH_EVERY rows, and every step is
+# journaled, so --resume continues where a crashed run stopped. Sites are crawled politely: rate-limited, interleaved,
+# and paused when they answer 429 (see fetch_engine.py).
+with Journal(JOURNAL_PATH, resume=args.resume) as journal, MetaCache() as cache, SummaryCache() as summary_cache, \
+        FetchEngine(rate=RATE_PER_HOST, respect_robots=True) as engine, \
+        SummaryScheduler(cache=summary_cache, model=MODEL_NAME, api_url=OLLAMA_API_URL) as scheduler:
+    summarizer = BatchScheduler(scheduler) if BATCH_PROMPTS else scheduler
+    todo = journal.pending(links)
+    replayed = journal.replay(todo)
+    if args.resume:
+        print(f"Resuming: {len(links) - len(todo)} rows already written, {len(replayed)} summaries to write")
+    to_summarize = [link for link in todo if not journal.done(link, SUMMARIZED)]
+    fetch = journaled(lambda engine, link: fetch_page(engine, link, cache), journal, fields=("description",))
+    pages = itertools.chain(replayed, iter_pipeline(engine, summarizer, to_summarize, fetch, make_prompt))
+
+    on_flush = lambda written: [journal.record(link, WRITTEN) for link in written]
+    with CsvWriter(web_links, CSV_PATH, links, column="Description", chunk_size=FLUSH_EVERY, on_flush=on_flush) as writer:
+        for page in pages:
+            if "summary_error" in page:
+                # Handle errors (e.g., timeout, invalid response)
+                print(f"Error processing {page['url']}: {page['summary_error']}")
+                continue
+            journal.record(page['url'], SUMMARIZED, summary=page['summary'])
+
+            # Print the reconstructed response
+            print(f"Website: {page['url']}")
+            print(f"Summary: {page['summary']}")
+            print("-" * 50)
+
+            writer.add(page['url'], page['summary'])
+
+# Per-stage latency, bytes, cache hit rates, LLM throughput and errors of the run (see metrics.py)
+print(registry.report())
+if args.metrics:
+    registry.export(args.metrics)
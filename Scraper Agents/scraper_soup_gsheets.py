@@ -1,18 +1,30 @@
 # A web-scraping agent with the following features: 
 # 1. Can access and dump info from and to google sheets using the google API
 # 2. Accesses ONLY meta tags of the website as we are only concerned with the website description 
-# 3. Uses beautiful soup to access only meta tags, then passes the scraped information to an LLM (Ollama) to summarize concisely.
+# 3. Streams only the <head> of each page to access its meta tags, then passes the scraped information to an LLM (Ollama) to summarize concisely.
+#    Pages are fetched and summarised concurrently, each description going to the LLM as soon as its page arrives.
 # 4. Dumps the summary right next to its corresponding link on the Google Sheet in the same row.
 
 # Imports 
-import requests
-from bs4 import BeautifulSoup 
+import argparse
+import itertools
+
 import gspread
-import json
 from google.oauth2.service_account import Credentials
 
+from checkpoint import SUMMARIZED, WRITTEN, Journal, journaled
+from fetch_engine import MAX_CONCURRENCY, PER_HOST_CONCURRENCY, FetchEngine
+from llm_scheduler import BatchScheduler, SummaryScheduler, iter_pipeline
+from meta_cache import MetaCache, fetch_meta
+from metrics import registry
+from ollama_client import SummaryCache
+from sheet_writer import SheetWriter
+
 OLLAMA_API_URL = "http://127.0.0.1:11434/api/chat"
 MODEL_NAME = "mistral"
+BATCH_PROMPTS = True    # Pack several descriptions into each Ollama request (see llm_scheduler.BatchScheduler)
+JOURNAL_PATH = "scraper_soup_gsheets.journal.jsonl"
+RATE_PER_HOST = 5    # Requests per second to any one site, lowered further by its robots.txt Crawl-delay
 
 # Using Google API credentials to access a particular sheet by its sheet ID, and return all URLs in the sheet
 def get_links():
@@ -25,63 +37,97 @@ def get_links():
     print("Fetched Links:", links)
     return links, sheet
 
-# Fetch data (only meta tag description) of the passed collection of URLs using beautiful soup. 
+# Fetch data (only meta tag description) of the passed collection of URLs. 
 # The way to optimise the process is to access only the metadata, specifically the description tag.
-def fetch_website_data(urls):
-    results = []
-    for url in urls:
-        try:
-            response = requests.get(url, timeout=10)
-            soup = BeautifulSoup(response.text, "html.parser")
-            title = soup.title.string if soup.title else "No Title"
-            meta_desc = soup.find("meta", attrs={"name": "description"})
-            description = meta_desc["content"] if meta_desc else "No Description"
-            results.append({"url": url, "title": title, "description": description})
-        except Exception as e:
-            results.append({"url": url, "error": str(e)})
-    return results
+# Only the <head> is streamed and parsed (see meta_extract.py), the rest of the page is never downloaded.
+# With a cache, unchanged pages are served from disk or revalidated with a conditional GET (see meta_cache.py).
+def fetch_one(engine, url, cache=None):
+    try:
+        title, description = fetch_meta(engine, url, cache)
+        return {"url": url, "title": title or "No Title", "description": description or "No Description"}
+    except Exception as e:
+        return {"url": url, "error": str(e)}
+
+# Pages are fetched concurrently over a pooled keep-alive session (see fetch_engine.py); results keep the order of urls.
+def fetch_website_data(urls, max_concurrency=MAX_CONCURRENCY, per_host=PER_HOST_CONCURRENCY, cache=None):
+    with FetchEngine(max_concurrency=max_concurrency, per_host=per_host) as engine:
+        return engine.map(lambda engine, url: fetch_one(engine, url, cache), urls)
+
+def description_prompt(website):
+    description = website.get('description', 'No Description')
+    if description == 'No Description':
+        return None
+    return f"Summarise the following description in one-line: {description}"
+
+# Fetching and summarising run as one producer/consumer pipeline: each description is sent to Ollama as soon as its page
+# arrives, over a bounded pool of concurrent requests with retries (see llm_scheduler.py). Records are yielded in the order
+# of urls as they complete. With a journal, pages fetched by an earlier run are not fetched again (see checkpoint.py).
+# Sites are crawled politely: rate-limited, interleaved, and paused when they answer 429 (see fetch_engine.py).
+def summarize_websites(urls, scheduler, cache=None, journal=None, max_concurrency=MAX_CONCURRENCY, per_host=PER_HOST_CONCURRENCY):
+    fetch = lambda engine, url: fetch_one(engine, url, cache)
+    if journal is not None:
+        fetch = journaled(fetch, journal)
+    with FetchEngine(max_concurrency=max_concurrency, per_host=per_host, rate=RATE_PER_HOST, respect_robots=True) as engine:
+        yield from iter_pipeline(engine, scheduler, urls, fetch, description_prompt)
 
 # Convert all website descriptions to concise one-line summaries using Ollama Mistral. Then, dump onto sheet.
-def convert_to_one_line(websites, sheet):
-    for website in websites:
-        try:
-            description = website.get('description', '')
-            
-            if description == 'No Description':
-                print(f"Skipping: {website['url']} (No Description)")
-                continue  
-
-            prompt = f"Summarise the following description in one-line: {description}"
-            
-            payload = {
-                "model": MODEL_NAME,
-                "messages": [{"role": "user", "content": prompt}],
-            }
-
-            response = requests.post(OLLAMA_API_URL, json=payload, stream=True, timeout=120)
-
-            full_response = ""
-            for chunk in response.iter_lines():
-                if chunk:
-                    try:
-                        data = json.loads(chunk)
-                        full_response += data.get("message", {}).get("content", "")
-                    except json.JSONDecodeError:
-                        print(f"Non-JSON chunk: {chunk.decode('utf-8')}")
-            
-            print(f"Summary for {website['url']}: {full_response.strip()}")
-            print("-" * 50)
-
-            row_index = sheet.find(website['url']).row
-            sheet.update_cell(row_index, 2, full_response.strip())  # Update second column with the summary
-            
-        except Exception as e:
-            print(f"Error processing {website['url']}: {e}")
+# websites can be the stream from summarize_websites: each summary is written as soon as it arrives, in chunked batch
+# updates against the link column fetched once (see sheet_writer.py). Records not summarised yet are summarised here.
+# Replies are memoized by (model, prompt), so a description seen before never reaches the model again (see ollama_client.py).
+# With a journal, every summary is journaled, and rows are marked written once their chunk is on the sheet.
+def convert_to_one_line(websites, sheet, scheduler, links=None, journal=None):
+    on_flush = None
+    if journal is not None:
+        on_flush = lambda written: [journal.record(url, WRITTEN) for url in written]
+    with SheetWriter(sheet, sheet.col_values(1) if links is None else links, on_flush=on_flush) as writer:
+        for website in websites:
+            try:
+                if "summary_error" in website:
+                    raise RuntimeError(website["summary_error"])
+                if "summary" not in website:
+                    prompt = description_prompt(website)
+                    if prompt is None:
+                        print(f"Skipping: {website['url']} (No Description)")
+                        continue
+                    future = scheduler.submit(prompt)
+                    scheduler.flush()
+                    website["summary"] = future.result()
+                summary = website["summary"]
+                if journal is not None:
+                    journal.record(website['url'], SUMMARIZED, summary=summary)
+
+                print(f"Summary for {website['url']}: {summary}")
+                print("-" * 50)
+
+                writer.add(website['url'], summary)  # Update second column with the summary
+
+            except Exception as e:
+                if "summary_error" not in website:    # Already counted by the pipeline
+                    registry.error("write", e)
+                print(f"Error processing {website['url']}: {e}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Summarise the links of a Google Sheet next to them")
+    parser.add_argument("--resume", action="store_true", help=f"Skip the work {JOURNAL_PATH} records as done")
+    parser.add_argument("--metrics", metavar="PATH", help="Export the run metrics to PATH (.json, or Prometheus text)")
+    args = parser.parse_args()
+
     urls, sheet = get_links()
-    websites_data = fetch_website_data(urls)
-    convert_to_one_line(websites_data, sheet)
+    with Journal(JOURNAL_PATH, resume=args.resume) as journal, MetaCache() as cache, SummaryCache() as summary_cache, \
+            SummaryScheduler(cache=summary_cache, model=MODEL_NAME, api_url=OLLAMA_API_URL) as scheduler:
+        summarizer = BatchScheduler(scheduler) if BATCH_PROMPTS else scheduler
+        todo = journal.pending(urls)
+        replayed = journal.replay(todo)
+        if args.resume:
+            print(f"Resuming: {len(urls) - len(todo)} rows already written, {len(replayed)} summaries to write")
+        to_summarize = [url for url in todo if not journal.done(url, SUMMARIZED)]
+        websites = itertools.chain(replayed, summarize_websites(to_summarize, summarizer, cache, journal))
+        convert_to_one_line(websites, sheet, summarizer, urls, journal)
+
+    # Per-stage latency, bytes, cache hit rates, LLM throughput and errors of the run (see metrics.py)
+    print(registry.report())
+    if args.metrics:
+        registry.export(args.metrics)
 
 if __name__ == "__main__":
     main()
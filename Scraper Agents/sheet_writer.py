@@ -0,0 +1,121 @@
+# Buffered write-back of summaries to a Google Sheet or a CSV file.
+# The row of every link is looked up in a dict built once from the link column (the col_values(1) result
+# get_links already has) instead of one sheet.find request per row, and values are written in chunked
+# batch_update calls, with consecutive rows merged into one range, instead of one update_cell request each.
+# CsvWriter does the same for a pandas-loaded CSV: every chunk rewrites the file atomically, so the file on disk
+# always holds the summaries written so far.
+
+import os
+
+from gspread.utils import rowcol_to_a1
+
+from metrics import registry
+
+CHUNK_SIZE = 200    # Values per batch_update request
+
+
+def row_index(links):
+    """Map every link to its 1-based sheet row; repeated links map to their first row, like sheet.find."""
+    rows = {}
+    for row, link in enumerate(links, 1):
+        rows.setdefault(link, row)
+    return rows
+
+
+def merge_ranges(cells, column):
+    """
+    Group cells into batch_update ranges, one per run of consecutive rows.
+
+    Args:
+        cells (dict): Row -> value.
+        column (int): 1-based column the values go to.
+
+    Returns:
+        list: [{"range": "B2:B4", "values": [[...], [...], [...]]}, ...]
+    """
+    ranges = []
+    for row in sorted(cells):
+        if ranges and row == ranges[-1]["end"] + 1:
+            ranges[-1]["end"] = row
+            ranges[-1]["values"].append([cells[row]])
+        else:
+            ranges.append({"start": row, "end": row, "values": [[cells[row]]]})
+    return [
+        {"range": f"{rowcol_to_a1(r['start'], column)}:{rowcol_to_a1(r['end'], column)}", "values": r["values"]}
+        for r in ranges
+    ]
+
+
+class SheetWriter:
+    """Buffers values keyed by link and writes them next to their links in chunked batch_update calls."""
+
+    def __init__(self, sheet, links, column=2, chunk_size=CHUNK_SIZE, on_flush=None):
+        self.sheet = sheet
+        self.rows = row_index(links)
+        self.column = column
+        self.chunk_size = chunk_size
+        self.on_flush = on_flush    # Called with the links of every written chunk
+        self.requests = 0
+        self._cells = {}
+
+    def add(self, link, value):
+        """Buffer a value for the row of link, flushing once chunk_size values are waiting. Raises KeyError for unknown links."""
+        self._cells[self.rows[link]] = (link, value)
+        if len(self._cells) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write every buffered value in one batch_update request."""
+        if not self._cells:
+            return
+        cells, self._cells = self._cells, {}
+        with registry.timer("write"):
+            self.sheet.batch_update(merge_ranges({row: value for row, (_, value) in cells.items()}, self.column))
+        self.requests += 1
+        if self.on_flush is not None:
+            self.on_flush([link for link, _ in cells.values()])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+
+class CsvWriter:
+    """Buffers values keyed by link into a DataFrame column and saves the CSV after every chunk."""
+
+    def __init__(self, frame, path, links, column="Description", chunk_size=CHUNK_SIZE, on_flush=None):
+        self.frame = frame
+        self.path = path
+        self.rows = row_index(links)
+        self.column = column
+        self.chunk_size = chunk_size
+        self.on_flush = on_flush    # Called with the links of every written chunk
+        self.frame[column] = self.frame[column].astype(object)
+        self._pending = []
+
+    def add(self, link, value):
+        """Set the value for the row of link, saving once chunk_size values are waiting. Raises KeyError for unknown links."""
+        self.frame.iat[self.rows[link] - 1, self.frame.columns.get_loc(self.column)] = value
+        self._pending.append(link)
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Rewrite the CSV through a temporary file, so a crash never leaves it half-written."""
+        if not self._pending:
+            return
+        written, self._pending = self._pending, []
+        tmp = self.path + ".tmp"
+        with registry.timer("write"):
+            self.frame.to_csv(tmp, index=False)
+            os.replace(tmp, self.path)
+        if self.on_flush is not None:
+            self.on_flush(written)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
@@ -0,0 +1,62 @@
+# Shared base of the on-disk SQLite caches.
+# Each cache is one SQLite table in WAL mode, keyed by a text primary key and bounded to max_entries rows:
+# past that, the least recently used rows (by their accessed_at column) are evicted. Subclasses only declare
+# the table schema and implement their own lookups on top of _db, holding _lock; a subclass bounded by something
+# other than a row count (the cube cache of query_to_api.py, bounded in bytes) overrides _evict().
+
+import sqlite3
+import threading
+import time
+
+
+class SQLiteCache:
+    """SQLite table of cache entries with LRU eviction past max_entries. Thread-safe."""
+
+    table = None    # Table name
+    key_column = "key"
+    columns = None    # Column definitions after the key, including "accessed_at REAL"
+
+    def __init__(self, path, max_entries=None):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({self.key_column} TEXT PRIMARY KEY, {self.columns})")
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_lru ON {self.table} (accessed_at)")
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        # Keep only the max_entries most recently used rows
+        self._db.execute(
+            f"DELETE FROM {self.table} WHERE {self.key_column} IN"
+            f" (SELECT {self.key_column} FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def _touch(self, key, now=None):
+        # Mark a row as just used; call with _lock held
+        self._db.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE {self.key_column} = ?", (now or time.time(), key))
+        self._db.commit()
+
+    def _store(self, row, **evict):
+        """Insert or replace a full row (key first, in column order), then evict; evict is passed on to _evict()."""
+        with self._lock:
+            self._db.execute(f"INSERT OR REPLACE INTO {self.table} VALUES ({', '.join('?' * len(row))})", row)
+            self._evict(**evict)
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,196 @@
+# Local stand-in HTTP servers for benchmarking the scraper agents without touching the network.
+
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE = (
+    "<html><head><title>Stub page {path}</title>"
+    '<meta name="description" content="A stand-in page served locally for {path}.">'
+    "</head><body>{body}</body></html>"
+)
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    """Keep-alive handler that neither logs requests nor complains about clients hanging up."""
+
+    protocol_version = "HTTP/1.1"    # keep-alive, like real servers
+
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            pass    # Client hung up early, e.g. after reading only the page head
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubPageHandler(QuietHandler):
+    """Serves a small HTML page after sleeping for the server's latency."""
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        body = PAGE.format(path=self.path, body=self.server.body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ConditionalPageHandler(StubPageHandler):
+    """Stub page with an ETag that answers matching If-None-Match requests with 304 Not Modified."""
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        body = PAGE.format(path=self.path, body=self.server.body).encode()
+        etag = f'"{zlib.crc32(body):08x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PoliteHostHandler(StubPageHandler):
+    """
+    Stub page host for politeness checks. Records the arrival time of every request in server.hits.
+    Optional server attributes (passed to serve()):
+        robots (str): Body served at /robots.txt.
+        throttle_every (int): Answer every n-th page request with 429 and a Retry-After header; a path is throttled at
+            most once, so its retry is always served.
+        retry_after (float): Seconds sent in that Retry-After header.
+    """
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            hits = getattr(self.server, "hits", None)
+            if hits is not None:
+                hits.append((time.monotonic(), self.path))
+            throttle_every = getattr(self.server, "throttle_every", 0)
+            throttled = bool(throttle_every) and self.path != "/robots.txt" and \
+                self.server.requests % throttle_every == 0 and self.path not in self.server.throttled_paths
+            if throttled:
+                self.server.throttled_paths.add(self.path)
+        if self.path == "/robots.txt":
+            body = getattr(self.server, "robots", "").encode()
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif throttled:
+            self.send_response(429)
+            self.send_header("Retry-After", str(getattr(self.server, "retry_after", 1)))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            super().do_GET()
+
+
+BATCH_ITEM = re.compile(r"^\d+\. (.*)$", re.MULTILINE)
+
+
+def mock_reply(prompt):
+    """Deterministic one-line reply of the mock model to a prompt."""
+    return f"Summary {hashlib.sha1(prompt.encode()).hexdigest()[:8]} of a {len(prompt)}-character prompt."
+
+
+class MockOllamaHandler(QuietHandler):
+    """
+    Stand-in for Ollama's /api/chat: sleeps for the server's latency, then streams a deterministic reply
+    as NDJSON chunks. Optional server attributes (passed to serve()):
+        stats (dict): stats["calls"] counts answered requests.
+        slots (threading.Semaphore): Requests generated at once, like OLLAMA_NUM_PARALLEL; the rest wait.
+        fail_every (int): Answer every n-th request with 503, to exercise retries.
+        item_latency (float): Extra generation time per item of a numbered multi-item prompt (and per single prompt).
+        garble_every (int): Drop the last line of every n-th multi-item reply, to exercise fallbacks.
+    """
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = payload["messages"][-1]["content"]
+        fail_every = getattr(self.server, "fail_every", 0)
+        stats = getattr(self.server, "stats", None)
+        with self.server.lock:
+            self.server.requests += 1
+            failing = bool(fail_every) and self.server.requests % fail_every == 0
+            if stats is not None and not failing:
+                stats["calls"] = stats.get("calls", 0) + 1
+        if failing:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        batched = prompt.startswith("Answer each of the following")
+        items = BATCH_ITEM.findall(prompt) if batched else [prompt]
+        slots = getattr(self.server, "slots", None) or nullcontext()
+        with slots:
+            generation = self.server.latency + getattr(self.server, "item_latency", 0.0) * len(items)
+            time.sleep(generation)
+        if not batched:
+            reply = mock_reply(prompt)
+        else:
+            lines = [f"{i}. {mock_reply(item)}" for i, item in enumerate(items, 1)]
+            garble_every = getattr(self.server, "garble_every", 0)
+            with self.server.lock:
+                self.server.batches += 1
+                if garble_every and self.server.batches % garble_every == 0:
+                    lines.pop()
+            reply = "\n".join(lines)
+        lines = [json.dumps({"message": {"content": word}, "done": False}) for word in re.findall(r"\S+\s*", reply)]
+        # Like Ollama, the final chunk reports the generated token count and the generation time in nanoseconds
+        lines.append(json.dumps({
+            "message": {"content": ""}, "done": True, "eval_count": len(lines), "eval_duration": int(generation * 1e9),
+        }))
+        body = ("\n".join(lines) + "\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@contextmanager
+def serve(handler=StubPageHandler, latency=0.0, body="", **attributes):
+    """
+    Run a threaded HTTP server on a free localhost port for the duration of the block.
+
+    Args:
+        handler: Request handler class.
+        latency (float): Seconds each request sleeps before answering.
+        body (str): Extra HTML placed in the page body, to simulate heavy pages.
+        attributes: Extra attributes set on the server, readable by the handler as self.server.<name>.
+
+    Yields:
+        str: Base URL of the server, e.g. "http://127.0.0.1:54321".
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.body = body
+    server.lock = threading.Lock()
+    server.requests = server.batches = 0
+    server.throttled_paths = set()
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
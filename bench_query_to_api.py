@@ -0,0 +1,416 @@
+# Benchmarks of query_to_api.py against local stubs of its remote services.
+#   geocode: every simulated query geocodes five places (the center and the four edges) on a stub of the Google
+#            Geocoding API, drawn from a small set of place names so they repeat across queries.
+#   extract: per-query latency of the five-call place-then-edges flow vs the single structured extraction call,
+#            on a stub chat model with a fixed latency per call.
+#   llm-cache: a stream of queries, many repeated with different case or spacing, answered by concurrent workers
+#            on the stub model, without and with the response cache (in-flight deduplication included).
+#   startup: import time of query_to_api in fresh interpreters, the import time of the heavy modules it now
+#            defers, and the latency of a first geocode-only query, from interpreter start to coordinates.
+#   cube-cache: fetch_map downloads through a stub openEO connection that writes a synthetic GeoTIFF after a fixed
+#            latency: a repeated request, a request inside a cached extent, identical concurrent requests, and a crop
+#            whose source cube an eviction tries to delete mid-crop.
+#   render:  peak memory and time of rendering a synthetic large 3-band uint16 GeoTIFF, each mode in a fresh
+#            interpreter: the original full-resolution float64 path, the decimated float32 preview (without and with
+#            overviews) and the full-resolution tiled export.
+#
+# Usage: python bench_query_to_api.py geocode [--queries 20] [--places 12] [--latency 0.1]
+#        python bench_query_to_api.py extract [--queries 5] [--latency 0.5]
+#        python bench_query_to_api.py llm-cache [--queries 200] [--distinct 20] [--workers 4] [--latency 0.2]
+#        python bench_query_to_api.py startup [--runs 5] [--latency 0.1]
+#        python bench_query_to_api.py cube-cache [--pixels 2000] [--latency 2.0]
+#        python bench_query_to_api.py render [--pixels 8000]
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+os.environ.setdefault("MAPS_API_KEY", "bench")
+
+import query_to_api
+
+
+class GeocodeHandler(BaseHTTPRequestHandler):
+    """Answers every address with deterministic coordinates after sleeping for the server's latency."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        address = parse_qs(urlsplit(self.path).query)["address"][0]
+        with self.server.lock:
+            self.server.requests += 1
+        h = zlib.crc32(address.encode())
+        location = {"lat": h % 180 - 90 + 0.5, "lng": h % 360 - 180 + 0.5}
+        body = json.dumps({"status": "OK", "results": [{"geometry": {"location": location}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(handler, latency):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.lock = threading.Lock()
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def uncached(location, api_url):
+    # The lookup as it was: a fresh connection per request, no cache
+    response = requests.get(api_url, params={"address": location, "key": "bench"})
+    geometry = response.json()["results"][0]["geometry"]["location"]
+    return geometry["lat"], geometry["lng"]
+
+
+def bench_geocode(args):
+    server = serve(GeocodeHandler, args.latency)
+    api_url = f"http://127.0.0.1:{server.server_address[1]}/geocode/json"
+    rng = random.Random(0)
+    places = [f"Place {i}, Somewhere" for i in range(args.places)]
+    queries = [rng.sample(places, 5) for _ in range(args.queries)]
+    print(f"{args.queries} queries x 5 lookups, {args.places} distinct places, {args.latency * 1000:.0f} ms per request")
+    print(f"{'mode':<28} {'time':>10} {'requests':>9}")
+
+    start, before = time.perf_counter(), server.requests
+    expected = [[uncached(place, api_url) for place in query] for query in queries]
+    print(f"{'sequential, uncached':<28} {time.perf_counter() - start:8.2f} s {server.requests - before:>9}")
+
+    with tempfile.TemporaryDirectory() as tmp, query_to_api.GeocodeCache(os.path.join(tmp, "geocode.sqlite")) as cache:
+        for name in ("concurrent, cold cache", "concurrent, warm cache"):
+            start, before = time.perf_counter(), server.requests
+            results = [query_to_api.get_coordinates_many(query, cache, api_url) for query in queries]
+            print(f"{name:<28} {time.perf_counter() - start:8.2f} s {server.requests - before:>9}")
+            assert results == expected, "coordinates differ"
+        print(f"Cache: {cache.hits} hits, {cache.misses} misses")
+    server.shutdown()
+
+
+class StubMessage:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubModel:
+    """Chat model stand-in: sleeps for latency per call and answers from the prompt."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, prompt):
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+        if prompt.startswith(query_to_api.EXTRACTION_PROMPT[:40]):
+            return StubMessage(
+                '```json\n{"place": "Lake Geneva, Switzerland", '
+                '"bbox": {"west": 6.15, "south": 46.2, "east": 6.95, "north": 46.54}, '
+                '"temporal_extent": ["2023-06-01", "2023-06-30"], "bands": null, "max_cloud_cover": 10}\n```'
+            )
+        return StubMessage("Lake Geneva, Switzerland")
+
+
+def bench_extract(args):
+    stub = StubModel(args.latency)
+    query = "Show me Lake Geneva in June 2023 with less than 10% clouds"
+    print(f"{args.queries} queries, {args.latency * 1000:.0f} ms per LLM call")
+    print(f"{'mode':<28} {'per query':>10} {'LLM calls':>10}")
+
+    start, calls = time.perf_counter(), stub.calls
+    for _ in range(args.queries):
+        response = query_to_api.process_query(query, llm=stub)
+        for edge in ("North", "South", "East", "West"):
+            query_to_api.process_query(f"{edge}-most location in {response}", llm=stub)
+    elapsed = (time.perf_counter() - start) / args.queries
+    print(f"{'place, then four edges':<28} {elapsed:8.2f} s {(stub.calls - calls) / args.queries:>10.0f}")
+
+    start, calls = time.perf_counter(), stub.calls
+    for _ in range(args.queries):
+        request = query_to_api.extract_request(query, stub)
+    elapsed = (time.perf_counter() - start) / args.queries
+    print(f"{'structured, single call':<28} {elapsed:8.2f} s {(stub.calls - calls) / args.queries:>10.0f}")
+    print(f"Request: {request}")
+
+
+def bench_llm_cache(args):
+    stub = StubModel(args.latency)
+    rng = random.Random(0)
+    places = [f"Show me lake {i} in June 2023" for i in range(args.distinct)]
+    # Users retype the same questions with different case and spacing
+    variants = [lambda q: q, str.upper, lambda q: "  " + q.replace(" ", "  ") + " "]
+    queries = [rng.choice(variants)(rng.choice(places)) for _ in range(args.queries)]
+    print(f"{args.queries} queries, {args.distinct} distinct, {args.workers} workers, {args.latency * 1000:.0f} ms per LLM call")
+    print(f"{'mode':<22} {'time':>10} {'LLM calls':>10}")
+
+    start, calls = time.perf_counter(), stub.calls
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        expected = list(pool.map(lambda q: query_to_api.extract_request(q, stub), queries))
+    print(f"{'uncached':<22} {time.perf_counter() - start:8.2f} s {stub.calls - calls:>10}")
+
+    with tempfile.TemporaryDirectory() as tmp, query_to_api.LLMCache(os.path.join(tmp, "llm.sqlite")) as cache:
+        for name in ("cold cache", "warm cache"):
+            start, calls = time.perf_counter(), stub.calls
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                results = list(pool.map(lambda q: query_to_api.extract_request(q, stub, llm_cache=cache), queries))
+            print(f"{name:<22} {time.perf_counter() - start:8.2f} s {stub.calls - calls:>10}")
+            assert results == expected, "requests differ"
+        print(f"Cache: {cache.stats()}")
+
+
+DEFERRED = ["numpy", "matplotlib.pyplot", "rasterio", "openeo", "langchain_google_genai"]
+
+
+def run_python(code, runs):
+    """Median wall time of code in fresh interpreters, or None if it fails (e.g. a module is not installed)."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if result.returncode:
+            return None
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def bench_startup(args):
+    baseline = run_python("pass", args.runs)
+    print(f"Median of {args.runs} fresh interpreters, interpreter start ({baseline * 1000:.0f} ms) subtracted")
+    print(f"{'import':<34} {'time':>10}")
+    print(f"{'query_to_api':<34} {(run_python('import query_to_api', args.runs) - baseline) * 1000:8.0f} ms")
+    for module in DEFERRED:
+        elapsed = run_python(f"import {module}", args.runs)
+        shown = f"{(elapsed - baseline) * 1000:8.0f} ms" if elapsed is not None else f"{'not installed':>11}"
+        print(f"{module + ' (deferred)':<34} {shown}")
+
+    server = serve(GeocodeHandler, args.latency)
+    api_url = f"http://127.0.0.1:{server.server_address[1]}/geocode/json"
+    code = f"import query_to_api; print(query_to_api.get_coordinates('Lake Geneva', api_url={api_url!r}))"
+    elapsed = run_python(code, args.runs)
+    print(f"{'first geocode-only query':<34} {(elapsed - baseline) * 1000:8.0f} ms  ({args.latency * 1000:.0f} ms of it API latency)")
+    server.shutdown()
+
+
+class StubCube:
+    def __init__(self, connection, spatial_extent, bands):
+        self.connection = connection
+        self.extent = spatial_extent
+        self.bands = bands
+
+    def download(self, path, format="GTiff"):
+        import numpy as np
+        import rasterio
+        from rasterio.transform import from_bounds
+
+        time.sleep(self.connection.latency)
+        with self.connection.lock:
+            self.connection.downloads += 1
+        e, n = self.extent, self.connection.pixels
+        transform = from_bounds(e["west"], e["south"], e["east"], e["north"], n, n)
+        data = np.random.default_rng(0).integers(0, 10000, (len(self.bands), n, n), dtype=np.uint16)
+        with rasterio.open(path, "w", driver="GTiff", width=n, height=n, count=len(self.bands), dtype="uint16",
+                           crs=e["crs"], transform=transform, tiled=True) as dst:
+            dst.write(data)
+
+
+class StubConnection:
+    """openEO connection stand-in: every download sleeps for latency and writes a pixels x pixels GeoTIFF."""
+
+    def __init__(self, latency, pixels):
+        self.latency = latency
+        self.pixels = pixels
+        self.downloads = 0
+        self.lock = threading.Lock()
+
+    def load_collection(self, collection, temporal_extent, spatial_extent, bands, max_cloud_cover):
+        return StubCube(self, spatial_extent, bands)
+
+
+def bench_cube_cache(args):
+    import rasterio
+
+    connection = StubConnection(args.latency, args.pixels)
+    query_to_api._clients["connection"] = connection
+    bands = ["B04", "B03", "B02"]
+    lake = dict(temp_start="2023-06-01", temp_end="2023-06-30", crs="EPSG:4326", bands=bands, max_cc=10)
+    full = dict(west=6.15, south=46.2, east=6.95, north=46.54, **lake)
+    inside = dict(west=6.5, south=46.3, east=6.7, north=46.45, **lake)
+    print(f"{args.pixels} x {args.pixels} px cubes, {args.latency * 1000:.0f} ms per download")
+    print(f"{'request':<32} {'time':>10} {'downloads':>10}  size")
+
+    def timed(name, fn):
+        start, before = time.perf_counter(), connection.downloads
+        paths = fn()
+        with rasterio.open(paths[0]) as src:
+            size = f"{src.width} x {src.height} px"
+        print(f"{name:<32} {time.perf_counter() - start:8.2f} s {connection.downloads - before:>10}  {size}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)    # Uncached downloads go to the working directory
+        try:
+            timed("uncached, twice", lambda: [query_to_api.download_cube(**full) for _ in range(2)])
+        finally:
+            os.chdir(cwd)
+        with query_to_api.CubeCache(os.path.join(tmp, "cubes")) as cache:
+            timed("cold cache", lambda: [query_to_api.download_cube(**full, cache=cache)])
+            timed("same request", lambda: [query_to_api.download_cube(**full, cache=cache)])
+            timed("inside a cached extent", lambda: [query_to_api.download_cube(**inside, cache=cache)])
+            other = dict(full, max_cc=30)
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                timed("4 identical, concurrently", lambda: list(pool.map(lambda _: query_to_api.download_cube(**other, cache=cache), range(4))))
+            print(f"Cache: {cache.hits} hits, {cache.crops} crops, {cache.misses} downloads, {len(cache)} cubes")
+            assert cache.hits + cache.crops + cache.misses == 7 and not cache._key_locks and not cache._pinned
+
+        # A cache too small for any cube evicts on every store; the cube being cropped must survive it
+        crop_raster = query_to_api.crop_raster
+
+        def evicting_crop(*crop_args):
+            with tight._lock:
+                tight._evict()
+            crop_raster(*crop_args)
+
+        with query_to_api.CubeCache(os.path.join(tmp, "tight"), max_bytes=1) as tight:
+            query_to_api.download_cube(**full, cache=tight)
+            query_to_api.crop_raster = evicting_crop
+            try:
+                timed("crop while evicting", lambda: [query_to_api.download_cube(**inside, cache=tight)])
+            finally:
+                query_to_api.crop_raster = crop_raster
+            assert tight.crops == 1 and not tight._pinned
+
+
+def render_original(path):
+    # The rendering as it was: full bands, float64 normalization and np.dstack
+    import numpy as np
+    import rasterio
+
+    with rasterio.open(path) as src:
+        red, green, blue = src.read(1), src.read(2), src.read(3)
+        return np.dstack((red / red.max(), green / green.max(), blue / blue.max()))
+
+
+def memory_kb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+
+
+def render_child(mode, path, target):
+    """Run one rendering mode and print its time and peak memory increase as JSON (called in a fresh interpreter)."""
+    import numpy as np
+    import rasterio
+
+    # Reset the peak resident set size (Linux), so only the rendering counts
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    baseline = memory_kb("VmRSS")
+    start = time.perf_counter()
+    if mode == "original":
+        shape = render_original(path).shape
+    elif mode == "export":
+        query_to_api.export_rgb(path, target)
+        with rasterio.open(target) as dst:
+            shape = (dst.height, dst.width, dst.count)
+    else:
+        shape = query_to_api.render_preview(path).shape
+    elapsed = time.perf_counter() - start
+    peak = memory_kb("VmHWM") - baseline
+    print(json.dumps({"seconds": elapsed, "peak_mb": peak / 1024, "shape": list(shape)}))
+
+
+def write_synthetic(path, pixels):
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_bounds
+
+    rng = np.random.default_rng(0)
+    profile = dict(driver="GTiff", width=pixels, height=pixels, count=3, dtype="uint16", crs="EPSG:4326",
+                   transform=from_bounds(6.15, 46.2, 6.95, 46.54, pixels, pixels), tiled=True, blockxsize=512, blockysize=512)
+    with rasterio.open(path, "w", **profile) as dst:
+        for _, window in dst.block_windows(1):
+            dst.write(rng.integers(0, 10000, (3, window.height, window.width), dtype=np.uint16), window=window)
+
+
+def bench_render(args):
+    import rasterio
+    from rasterio.enums import Resampling
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path, target = os.path.join(tmp, "large.tif"), os.path.join(tmp, "export.tif")
+        write_synthetic(path, args.pixels)
+        print(f"{args.pixels} x {args.pixels} px, 3 uint16 bands ({os.path.getsize(path) / 1024 ** 2:.0f} MB on disk)")
+        print(f"{'mode':<34} {'time':>10} {'peak memory':>12}  output")
+
+        def run(name, mode):
+            code = f"import bench_query_to_api as b; b.render_child({mode!r}, {path!r}, {target!r})"
+            result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+            r = json.loads(result.stdout.splitlines()[-1])
+            print(f"{name:<34} {r['seconds']:8.2f} s {r['peak_mb']:9.0f} MB  {' x '.join(map(str, r['shape']))}")
+
+        run("original (full float64)", "original")
+        run("preview, decimated read", "preview")
+        with rasterio.open(path, "r+") as dst:
+            dst.build_overviews([2, 4, 8, 16], Resampling.average)
+        run("preview, from overviews", "preview")
+        run("full-resolution tiled export", "export")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query_to_api.py against local stubs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    geocode = commands.add_parser("geocode", help="Geocoding: uncached vs cached and concurrent")
+    geocode.add_argument("--queries", type=int, default=20, help="Number of simulated queries")
+    geocode.add_argument("--places", type=int, default=12, help="Number of distinct place names")
+    geocode.add_argument("--latency", type=float, default=0.1, help="Simulated Geocoding API latency in seconds")
+    geocode.set_defaults(run=bench_geocode)
+    extract = commands.add_parser("extract", help="LLM extraction: five calls vs one structured call")
+    extract.add_argument("--queries", type=int, default=5, help="Number of simulated queries")
+    extract.add_argument("--latency", type=float, default=0.5, help="Simulated LLM latency per call in seconds")
+    extract.set_defaults(run=bench_extract)
+    llm_cache = commands.add_parser("llm-cache", help="LLM calls without and with the response cache")
+    llm_cache.add_argument("--queries", type=int, default=200, help="Number of simulated queries")
+    llm_cache.add_argument("--distinct", type=int, default=20, help="Number of distinct queries")
+    llm_cache.add_argument("--workers", type=int, default=4, help="Queries answered at once")
+    llm_cache.add_argument("--latency", type=float, default=0.2, help="Simulated LLM latency per call in seconds")
+    llm_cache.set_defaults(run=bench_llm_cache)
+    startup = commands.add_parser("startup", help="Import time and first-query latency")
+    startup.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    startup.add_argument("--latency", type=float, default=0.1, help="Simulated Geocoding API latency in seconds")
+    startup.set_defaults(run=bench_startup)
+    cube_cache = commands.add_parser("cube-cache", help="Sentinel-2 downloads without and with the cube cache")
+    cube_cache.add_argument("--pixels", type=int, default=2000, help="Width and height of the synthetic cubes")
+    cube_cache.add_argument("--latency", type=float, default=2.0, help="Simulated openEO processing and download time")
+    cube_cache.set_defaults(run=bench_cube_cache)
+    render = commands.add_parser("render", help="Peak memory of rendering a large GeoTIFF")
+    render.add_argument("--pixels", type=int, default=8000, help="Width and height of the synthetic GeoTIFF")
+    render.set_defaults(run=bench_render)
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,80 +4,538 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import openeo
-import matplotlib.pyplot as plt
-import rasterio
-from rasterio.plot import show
-import requests
-from dotenv import load_dotenv
+# Only standard-library modules are imported up front. The openEO connection, the Gemini model and the HTTP session
+# are created on first use by get_connection(), get_model() and get_session(), then reused; requests, openeo,
+# langchain, rasterio, numpy and matplotlib are imported only by the functions that need them. Geocode-only use therefore starts instantly,
+# without network access or an interactive OIDC login.
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
 
-import numpy as np  # Make sure to import numpy for np.dstack
+# The SQLite LRU cache base is shared with the scraper agents
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Scraper Agents"))
+from sqlite_cache import SQLiteCache
 
-# Connect to the OpenEO backend
-connection = openeo.connect(url="openeo.dataspace.copernicus.eu")
+OPENEO_URL = "openeo.dataspace.copernicus.eu"
+MODEL_NAME = "gemini-pro"
 
-# Authenticate using OpenID Connect
-connection.authenticate_oidc()
+# Geocoding configuration. Results are cached on disk (keyed by the normalized place name) so repeated places
+# are never geocoded twice within the TTL, and requests share one pooled keep-alive session.
+GEOCODE_API_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+GEOCODE_CACHE_PATH = os.environ.get(
+    "GEOCODE_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".geocode_cache.sqlite"),
+)
+GEOCODE_TTL = 30 * 24 * 3600    # Seconds a geocoded place is trusted; places rarely move
+GEOCODE_MAX_ENTRIES = 10_000
+GEOCODE_WORKERS = 5    # Lookups in flight at once: the center and the four edges of a query
+GEOCODE_TIMEOUT = 10
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from dotenv import load_dotenv
-import os
-import json
+# Lazily created clients, shared by every caller
+_clients = {}
+_client_locks = {}
+_clients_lock = threading.Lock()
+_env_loaded = False
+
+def getenv(name: str):
+    """Value of an environment variable, loading the .env file the first time one is not set."""
+    global _env_loaded
+    if name not in os.environ and not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+    return os.environ.get(name)
+
+def _client(name: str, create):
+    # Create a client once, even when several threads ask for it at the same time
+    with _clients_lock:
+        if name in _clients:
+            return _clients[name]
+        lock = _client_locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in _clients:
+            _clients[name] = create()
+        return _clients[name]
+
+def _connect():
+    import openeo
+
+    # Connect to the OpenEO backend
+    connection = openeo.connect(url=OPENEO_URL)
+
+    # Authenticate using OpenID Connect
+    connection.authenticate_oidc()
+    return connection
+
+def _create_model():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    google_api_key = getenv('GOOGLE_API_KEY')
+    if not google_api_key:
+        raise ValueError("GOOGLE_API_KEY not found in environment variables.")
+    return ChatGoogleGenerativeAI(model=MODEL_NAME, google_api_key=google_api_key)
+
+def _create_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=GEOCODE_WORKERS))
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=GEOCODE_WORKERS))
+    return session
+
+def get_connection():
+    """The authenticated openEO connection, created on first use."""
+    return _client("connection", _connect)
+
+def get_model():
+    """The Gemini chat model, created on first use."""
+    return _client("model", _create_model)
+
+def get_session():
+    """The pooled keep-alive HTTP session, created on first use."""
+    return _client("session", _create_session)
+
+def __getattr__(name):
+    # connection, model and session remain available as module attributes, created when first accessed
+    getters = {"connection": get_connection, "model": get_model, "session": get_session}
+    if name in getters:
+        return getters[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# LLM response cache. Replies are stored on disk keyed by the model name and the normalized prompt, so a repeated
+# or near-identical query (differing only in case or whitespace) is answered without a paid API call, and
+# identical prompts asked concurrently share one request.
+LLM_CACHE_PATH = os.environ.get(
+    "LLM_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.sqlite"),
+)
+LLM_CACHE_TTL = 7 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 5_000
+
+# Structured extraction: one LLM call returns the place, its bounding box, the time range, the bands and the cloud
+# cover of a query as a JSON object, instead of one call for the place and four more for its edges.
+STRUCTURED_OUTPUT = True    # Set to False for the original place-then-edges flow
+SENTINEL2_BANDS = {"B01", "B02", "B03", "B04", "B05", "B06", "B07", "B08", "B8A", "B09", "B11", "B12", "SCL"}
+DEFAULT_BANDS = ["B04", "B03", "B02"]    # True-colour composite
+DEFAULT_MAX_CC = 20
+DEFAULT_DAYS = 30    # Time range when the query names none: the last DEFAULT_DAYS days
+DEFAULT_HALF_WIDTH = 0.05    # Degrees around a geocoded place when the model gives no bounding box
+DEFAULT_CRS = "EPSG:4326"
+
+# Downloaded Sentinel-2 cubes are cached on disk, each under the hash of its canonical request, so an identical
+# request is never downloaded again and concurrent queries never write to the same file. A request whose extent lies
+# inside a cached one (same collection, time range, bands and cloud cover) is cropped locally from it. The cache is
+# bounded in bytes: past max_bytes, the least recently used cubes are deleted.
+COLLECTION = "SENTINEL2_L2A"
+CUBE_CACHE_DIR = os.environ.get(
+    "SENTINEL_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sentinel_cache"),
+)
+CUBE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+COORDINATE_DIGITS = 6    # Coordinates are rounded to about 0.1 m before hashing
+
+def canonical_request(collection, temp_start, temp_end, west, south, east, north, crs, bands, max_cc):
+    """The request parameters in canonical form: rounded coordinates, upper-case CRS and bands, float cloud cover."""
+    return {
+        "collection": collection,
+        "temporal_extent": [str(temp_start), str(temp_end)],
+        "extent": [round(float(value), COORDINATE_DIGITS) for value in (west, south, east, north)],
+        "crs": str(crs).upper(),
+        "bands": [band.upper() for band in bands],
+        "max_cc": float(max_cc),
+    }
+
+def request_key(request: dict):
+    """Content address of a canonical request."""
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+def crop_raster(source: str, target: str, west, south, east, north, crs):
+    """Write the part of the source GeoTIFF inside the given bounds (in crs) to target."""
+    import rasterio
+    from rasterio.warp import transform_bounds
+    from rasterio.windows import Window, from_bounds
+
+    with rasterio.open(source) as src:
+        bounds = transform_bounds(crs, src.crs, west, south, east, north) if src.crs else (west, south, east, north)
+        window = from_bounds(*bounds, transform=src.transform).round_offsets().round_lengths()
+        window = window.intersection(Window(0, 0, src.width, src.height))
+        profile = src.profile.copy()
+        profile.update(width=window.width, height=window.height, transform=src.window_transform(window))
+        with rasterio.open(target, "w", **profile) as dst:
+            dst.write(src.read(window=window))
+
+class CubeCache(SQLiteCache):
+    """Size-bounded, content-addressed store of downloaded cubes, indexed in SQLite. Thread-safe."""
+
+    table = "cubes"
+    columns = "params TEXT, west REAL, south REAL, east REAL, north REAL, path TEXT, size INTEGER, accessed_at REAL"
+
+    def __init__(self, directory=CUBE_CACHE_DIR, max_bytes=CUBE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.crops = self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._key_locks = {}    # Key -> [lock, number of callers holding or waiting for it]
+        self._pinned = {}    # Key -> number of crops reading its cube; pinned cubes are never evicted
+        super().__init__(os.path.join(directory, "index.sqlite"))
+        self._db.execute("CREATE INDEX IF NOT EXISTS cubes_params ON cubes (params)")
+        self._db.commit()
+
+    def _evict(self, keep=None):
+        # Bounded in bytes rather than entries: delete the least recently used cubes until the total fits max_bytes
+        rows = self._db.execute("SELECT key, path, size FROM cubes ORDER BY accessed_at DESC").fetchall()
+        total = 0
+        for key, path, size in rows:
+            total += size
+            if total > self.max_bytes and key != keep and key not in self._pinned:
+                self._db.execute("DELETE FROM cubes WHERE key = ?", (key,))
+                if os.path.exists(path):
+                    os.remove(path)
+                total -= size
+
+    def _lookup(self, key, request):
+        # The path of the cube of key, or of a cached cube containing the request extent (with its key)
+        row = self._db.execute("SELECT path FROM cubes WHERE key = ?", (key,)).fetchone()
+        if row is not None and os.path.exists(row[0]):
+            return key, row[0]
+        params = json.dumps({k: v for k, v in request.items() if k != "extent"}, sort_keys=True)
+        west, south, east, north = request["extent"]
+        row = self._db.execute(
+            "SELECT key, path FROM cubes WHERE params = ? AND west <= ? AND south <= ? AND east >= ? AND north >= ?"
+            " ORDER BY size LIMIT 1",
+            (params, west, south, east, north),
+        ).fetchone()
+        if row is not None and os.path.exists(row[1]):
+            return row[0], row[1]
+        return None, None
+
+    def _add(self, key, request, path):
+        params = json.dumps({k: v for k, v in request.items() if k != "extent"}, sort_keys=True)
+        self._store((key, params, *request["extent"], path, os.path.getsize(path), time.time()), keep=key)
+
+    def get(self, request: dict, download):
+        """
+        Path of the GeoTIFF of a canonical request: cached, cropped from a cached cube containing it, or downloaded.
 
-# Load environment variables
-load_dotenv()
-google_api_key = os.environ['GOOGLE_API_KEY']
+        Args:
+            request (dict): Canonical request (see canonical_request).
+            download (callable): download(path) writes the cube of the request to path; called on a miss.
 
-# Initialize the model
-model = ChatGoogleGenerativeAI(model="gemini-pro", google_api_key=google_api_key)
+        Returns:
+            str: Path of the GeoTIFF inside the cache directory.
+        """
+        key = request_key(request)
+        path = os.path.join(self.directory, f"{key}.tif")
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:    # Identical concurrent requests wait for the first one instead of downloading again
+                return self._get(key, path, request, download)
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self._key_locks[key]
+
+    def _get(self, key, path, request, download):
+        with self._lock:
+            found, source = self._lookup(key, request)
+            if found == key:
+                self.hits += 1
+                self._touch(key)
+                return source
+            if found is not None:    # Keep the containing cube from being evicted while it is cropped
+                self._pinned[found] = self._pinned.get(found, 0) + 1
+        # Write to a unique temporary file, then move it into place, so readers never see a partial cube
+        partial = os.path.join(self.directory, f"{key}.{uuid.uuid4().hex}.part")
+        try:
+            if source is not None:
+                crop_raster(source, partial, *request["extent"], request["crs"])
+            else:
+                download(partial)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+            if found is not None:
+                with self._lock:
+                    self._pinned[found] -= 1
+                    if not self._pinned[found]:
+                        del self._pinned[found]
+        with self._lock:
+            if source is not None:
+                self.crops += 1
+            else:
+                self.misses += 1
+        self._add(key, request, path)
+        return path
+
+def download_cube(temp_start, temp_end, west, south, east, north, crs, bands, max_cc, cache=None):
+    """
+    Download the Sentinel-2 cube of a request as a GeoTIFF.
+
+    Args:
+        cache (CubeCache): Optional cube cache; without it every call downloads to a new file named after the request.
+
+    Returns:
+        str: Path of the GeoTIFF.
+    """
+    request = canonical_request(COLLECTION, temp_start, temp_end, west, south, east, north, crs, bands, max_cc)
+
+    def download(output_file):
+        s2_cube = get_connection().load_collection(       # Load Sentinel-2 data collection)
+            COLLECTION,
+            temporal_extent=(temp_start, temp_end),
+            spatial_extent={
+                "west": west,
+                "south": south,
+                "east": east,
+                "north": north,
+                "crs": crs,
+            },
+            bands=bands,
+            max_cloud_cover=max_cc,
+        )
+        s2_cube.download(output_file, format="GTiff")
+
+    if cache is not None:
+        return cache.get(request, download)
+    output_file = f"sentinel2_{request_key(request)[:16]}.tif"
+    download(output_file)
+    return output_file
+
+# Rendering. The preview is read at screen resolution: decimated reads (served from the GeoTIFF overviews when it has
+# them) in float32, stretched in place between percentiles computed on a small sample, so a large extent never
+# allocates a full-resolution copy. A full-resolution 8-bit RGB export is written block by block.
+PREVIEW_SIZE = 1600    # Longest side of the on-screen preview, in pixels
+STRETCH_PERCENTILES = (2, 98)
+STRETCH_SAMPLE = 250_000    # Pixels per band the stretch limits are computed on
+EXPORT_BLOCK_SIZE = 512
+
+def rgb_indexes(bands):
+    """1-based raster indexes of the red, green and blue bands of a cube, or of its first bands."""
+    bands = [band.upper() for band in bands]
+    if set(DEFAULT_BANDS) <= set(bands):
+        return [bands.index(band) + 1 for band in DEFAULT_BANDS]
+    return list(range(1, min(3, len(bands)) + 1))
+
+def stretch_limits(src, indexes, sample=STRETCH_SAMPLE):
+    """Per-band (low, high) percentiles of an open raster, computed on a decimated read of about sample pixels."""
+    import numpy as np
+    from rasterio.enums import Resampling
+
+    scale = max(1.0, (src.width * src.height / sample) ** 0.5)
+    shape = (len(indexes), max(1, round(src.height / scale)), max(1, round(src.width / scale)))
+    data = src.read(indexes, out_shape=shape, out_dtype="float32", resampling=Resampling.nearest)
+    limits = []
+    for band in data:
+        values = band[band != src.nodata] if src.nodata is not None else band
+        limits.append(tuple(np.percentile(values if values.size else band, STRETCH_PERCENTILES)))
+    return limits
+
+def stretch(data, limits):
+    """Scale every band of a float32 (bands, rows, cols) array to 0..1 between its limits, in place."""
+    import numpy as np
+
+    for band, (low, high) in zip(data, limits):
+        band -= low
+        band /= (high - low) or 1.0
+        np.clip(band, 0.0, 1.0, out=band)
+    return data
+
+def render_preview(path, indexes=(1, 2, 3), max_size=PREVIEW_SIZE):
+    """
+    Read a stretched preview of a GeoTIFF at screen resolution.
+
+    Args:
+        path (str): GeoTIFF path.
+        indexes (list): 1-based indexes of the bands to show, red, green and blue.
+        max_size (int): Longest side of the preview in pixels; the bands are read decimated to fit.
+
+    Returns:
+        numpy.ndarray: (rows, cols, bands) float32 array with values in 0..1.
+    """
+    import numpy as np
+    import rasterio
+    from rasterio.enums import Resampling
+
+    indexes = list(indexes)
+    with rasterio.open(path) as src:
+        scale = max(1.0, max(src.width, src.height) / max_size)
+        shape = (len(indexes), max(1, round(src.height / scale)), max(1, round(src.width / scale)))
+        data = src.read(indexes, out_shape=shape, out_dtype="float32", resampling=Resampling.average)
+        stretch(data, stretch_limits(src, indexes))
+    return np.moveaxis(data, 0, -1)
+
+def export_rgb(path, target, indexes=(1, 2, 3)):
+    """
+    Write a full-resolution, stretched 8-bit copy of a GeoTIFF, tiled and compressed, one block at a time.
+
+    Returns:
+        str: target.
+    """
+    import rasterio
+
+    indexes = list(indexes)
+    with rasterio.open(path) as src:
+        limits = stretch_limits(src, indexes)
+        profile = src.profile.copy()
+        profile.update(
+            driver="GTiff", count=len(indexes), dtype="uint8", nodata=None, compress="deflate",
+            tiled=True, blockxsize=EXPORT_BLOCK_SIZE, blockysize=EXPORT_BLOCK_SIZE,
+        )
+        if len(indexes) == 3:
+            profile["photometric"] = "RGB"
+        with rasterio.open(target, "w", **profile) as dst:
+            for _, window in dst.block_windows(1):
+                data = stretch(src.read(indexes, window=window, out_dtype="float32"), limits)
+                data *= 255
+                dst.write(data.astype("uint8"), window=window)
+    return target
 
 # Define the fetch_map function
-def fetch_map(temp_start, temp_end, west, south, east, north, crs, bands, max_cc):
+def fetch_map(temp_start, temp_end, west, south, east, north, crs, bands, max_cc, cache=None, export=None):
     """
-    Fetch a map based on the input parameters.
-    This is a placeholder function; implement the actual logic as needed.
+    Fetch a map based on the input parameters and show a preview of it.
+    Cubes come from the cube cache when one is given (see CubeCache). With export, a full-resolution
+    8-bit RGB GeoTIFF is also written to that path (see export_rgb).
     """
+    import matplotlib.pyplot as plt
+
     print(f"Fetching map with parameters: {temp_start}, {temp_end}, {west}, {south}, {east}, {north}, {crs}, {bands}, {max_cc}")
-    s2_cube = connection.load_collection(       # Load Sentinel-2 data collection)
-        "SENTINEL2_L2A",
-        temporal_extent=(temp_start, temp_end),
-        spatial_extent={
-            "west": west,
-            "south": south,
-            "east": east,
-            "north": north,
-            "crs": crs,
-        },
-        bands=bands,
-        max_cloud_cover=max_cc,
-    )
+    output_file = download_cube(temp_start, temp_end, west, south, east, north, crs, bands, max_cc, cache)
 
-    output_file = "sentinel2_image.tif"
-    s2_cube.download(output_file)
+    # Red, green and blue bands (B04, B03, B02), read at screen resolution and stretched for visualization
+    indexes = rgb_indexes(bands)
+    rgb_image = render_preview(output_file, indexes)
+    if export:
+        print(f"Full-resolution image written to {export_rgb(output_file, export, indexes)}")
 
-    with rasterio.open(output_file) as src:
-        # Read the bands into arrays
-        red = src.read(1)  # Band B04
-        green = src.read(2)  # Band B03
-        blue = src.read(3)  # Band B02
+    plt.figure(figsize=(10, 10))
+    plt.imshow(rgb_image if len(indexes) == 3 else rgb_image[..., 0], cmap=None if len(indexes) == 3 else "gray")
+    plt.title("Sentinel-2 RGB Composite")
+    plt.axis('off')
+    plt.show()
+    # Want to mention the exact date and timestamp of the image.
 
-        # Normalize the bands for better visualization
-        red_norm = red / red.max()
-        green_norm = green / green.max()
-        blue_norm = blue / blue.max()
+def normalize_prompt(prompt: str):
+    """Case-folded prompt with whitespace collapsed, so near-identical queries share a cache entry."""
+    return " ".join(prompt.split()).casefold()
 
-        # Combine bands into an RGB image
-        rgb_image = np.dstack((red_norm, green_norm, blue_norm))
+def prompt_key(model_name: str, prompt: str):
+    """Cache key of a prompt sent to a model."""
+    return hashlib.sha256(f"{model_name}\0{normalize_prompt(prompt)}".encode()).hexdigest()
 
-        plt.figure(figsize=(10, 10))
-        plt.imshow(rgb_image)
-        plt.title("Sentinel-2 RGB Composite")
-        plt.axis('off')
-        plt.show()
-    # Want to mention the exact date and timestamp of the image.
+class LLMCache(SQLiteCache):
+    """
+    SQLite-backed memo of model replies keyed by (model name, normalized prompt), with TTL and LRU eviction.
+    Concurrent requests for the same prompt are deduplicated: one caller asks the model, the others wait for
+    its reply. Thread-safe.
+    """
+
+    table = "replies"
+    columns = "reply TEXT, created_at REAL, accessed_at REAL"
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.hits = self.misses = self.deduplicated = 0
+        self._inflight = {}
+        super().__init__(path, max_entries)
+
+    def _get(self, key, now):
+        row = self._db.execute("SELECT reply, created_at FROM replies WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] >= self.ttl:
+            return None
+        self._touch(key, now)
+        return row[0]
+
+    def get(self, model_name: str, prompt: str):
+        """Return the cached reply of a prompt younger than the TTL, or None."""
+        with self._lock:
+            return self._get(prompt_key(model_name, prompt), time.time())
+
+    def put(self, model_name: str, prompt: str, reply: str):
+        now = time.time()
+        self._store((prompt_key(model_name, prompt), reply, now, now))
+
+    def fetch(self, model_name: str, prompt: str, ask):
+        """
+        The reply to a prompt: from the cache, from an identical request already in flight, or from ask().
+
+        Args:
+            model_name (str): Name of the model, part of the cache key.
+            prompt (str): Prompt sent to the model.
+            ask (callable): ask() -> reply, called on a miss.
+
+        Returns:
+            str: The reply.
+        """
+        key = prompt_key(model_name, prompt)
+        with self._lock:
+            reply = self._get(key, time.time())
+            if reply is not None:
+                self.hits += 1
+                return reply
+            pending = self._inflight.get(key)
+            if pending is None:
+                self.misses += 1
+                pending = self._inflight[key] = Future()
+                owner = True
+            else:
+                self.deduplicated += 1
+                owner = False
+        if not owner:
+            return pending.result()
+        try:
+            reply = ask()
+            self.put(model_name, prompt, reply)
+            pending.set_result(reply)
+            return reply
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        """Lookup counts and the share of prompts answered without a model request."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.deduplicated
+            saved = self.hits + self.deduplicated
+            return {
+                "hits": self.hits, "misses": self.misses, "deduplicated": self.deduplicated,
+                "hit_rate": saved / lookups if lookups else 0.0,
+            }
+
+def ask(prompt: str, llm=None, cache=None):
+    """
+    Send a prompt to the chat model and return the text of its reply.
+
+    Args:
+        prompt (str): Prompt for the model.
+        llm: Chat model with an invoke(prompt) method returning a message with .content; defaults to get_model().
+        cache (LLMCache): Optional response cache.
+
+    Returns:
+        str: The reply.
+    """
+    llm = llm or get_model()
+    if cache is None:
+        return llm.invoke(prompt).content
+    return cache.fetch(getattr(llm, "model", MODEL_NAME), prompt, lambda: llm.invoke(prompt).content)
 
 # Define the process_query function
-def process_query(query: str):
+def process_query(query: str, cache=None, llm=None):
     user_prompt = (
         "You are an assistant for querying satellite data. "
         "Your task is to extract the following information from the user's request: "
@@ -89,43 +547,195 @@ def process_query(query: str):
         f"User query: {query}"
     )
 
-    # Get the response from the model
-    llm_response = model.invoke(user_prompt)
-    print("LLM Raw Response:", llm_response)  # Debugging step
-    
-    # Extract the content
-    response_content = llm_response.content
+    # Get the response from the model, or from the cache
+    response_content = ask(user_prompt, llm, cache)
     print(response_content)
 
     return response_content
 
-def get_coordinates(location: str):
+EXTRACTION_PROMPT = (
+    "You are an assistant for querying Sentinel-2 satellite data. "
+    "Extract the request of the user below and answer with a single JSON object and no other text, with the keys:\n"
+    '  "place": official geographic name or address of the location,\n'
+    '  "bbox": {{"west": ..., "south": ..., "east": ..., "north": ...}} in WGS84 degrees, tightly enclosing the place,\n'
+    '  "temporal_extent": ["YYYY-MM-DD", "YYYY-MM-DD"], or null if the user gives no time range,\n'
+    '  "bands": list of Sentinel-2 band names (B01-B12, B8A, SCL), or null for a true-colour image,\n'
+    '  "max_cloud_cover": maximum cloud cover in percent, or null.\n'
+    "If the place is vague, or you are not sure what exactly it points to, answer "
+    '{{"clarification": "<question for the user>"}} instead.\n'
+    "For example, 'Show me a map of Sheraton Hotel, New York in the time-range 2022-12-03 to 2022-12-31' gives "
+    '{{"place": "Sheraton New York Times Square Hotel, 811 7th Avenue, New York, NY 10019", '
+    '"bbox": {{"west": -73.9835, "south": 40.7621, "east": -73.9805, "north": 40.7641}}, '
+    '"temporal_extent": ["2022-12-03", "2022-12-31"], "bands": null, "max_cloud_cover": null}}\n\n'
+    "User query: {query}"
+)
+
+def parse_json_object(text: str):
+    """The first JSON object in text, tolerating Markdown code fences around it. Raises ValueError if there is none."""
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match is None:
+        raise ValueError(f"No JSON object in the model response: {text!r}")
+    return json.loads(match.group(0))
+
+def _number(value, field: str):
+    """value as a float, if it is a JSON number. Raises ValueError otherwise."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{field} must be a number, got {value!r}")
+    return float(value)
+
+def validate_request(data: dict, cache=None):
+    """
+    Check an extracted request and fill in its defaults.
+
+    Args:
+        data (dict): JSON object returned by the model for EXTRACTION_PROMPT.
+        cache (GeocodeCache): Optional geocode cache, used when the model gives no bounding box.
+
+    Returns:
+        dict: The keyword arguments of fetch_map, plus "place".
+
+    Raises:
+        ValueError: If a field is missing, of the wrong type or out of range.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"The request must be a JSON object, got {data!r}")
+    place = data.get("place")
+    if not isinstance(place, str) or not place.strip():
+        raise ValueError(f"The request names no place: {place!r}")
+    place = place.strip()
+
+    bbox = data.get("bbox")
+    if bbox:
+        if not isinstance(bbox, dict) or not {"west", "south", "east", "north"} <= bbox.keys():
+            raise ValueError(f"Invalid bounding box: {bbox!r}")
+        west, south, east, north = (_number(bbox[key], key) for key in ("west", "south", "east", "north"))
+    else:
+        coordinates = get_coordinates(place, cache)
+        if coordinates is None:
+            raise ValueError(f"Could not locate {place!r}.")
+        lat, lng = coordinates
+        west, south, east, north = lng - DEFAULT_HALF_WIDTH, lat - DEFAULT_HALF_WIDTH, lng + DEFAULT_HALF_WIDTH, lat + DEFAULT_HALF_WIDTH
+    if not (-180 <= west < east <= 180 and -90 <= south < north <= 90):
+        raise ValueError(f"Invalid bounding box: west={west}, south={south}, east={east}, north={north}")
+
+    temporal_extent = data.get("temporal_extent")
+    if temporal_extent:
+        if not isinstance(temporal_extent, list) or len(temporal_extent) != 2 \
+                or not all(isinstance(day, str) for day in temporal_extent):
+            raise ValueError(f"Time range must be two YYYY-MM-DD dates, got {temporal_extent!r}")
+        temp_start, temp_end = (date.fromisoformat(day) for day in temporal_extent)
+    else:
+        temp_end = date.today()
+        temp_start = temp_end - timedelta(days=DEFAULT_DAYS)
+    if temp_start > temp_end:
+        raise ValueError(f"Time range ends before it starts: {temp_start} to {temp_end}")
+
+    bands = data.get("bands") or DEFAULT_BANDS
+    if not isinstance(bands, list) or not all(isinstance(band, str) for band in bands):
+        raise ValueError(f"Bands must be a list of band names, got {bands!r}")
+    bands = [band.upper() for band in bands]
+    unknown = set(bands) - SENTINEL2_BANDS
+    if unknown:
+        raise ValueError(f"Unknown Sentinel-2 bands: {sorted(unknown)}")
+
+    max_cc = data.get("max_cloud_cover")
+    max_cc = DEFAULT_MAX_CC if max_cc is None else _number(max_cc, "max_cloud_cover")
+    if not 0 <= max_cc <= 100:
+        raise ValueError(f"Cloud cover must be a percentage, got {max_cc}")
+
+    return {
+        "place": place,
+        "temp_start": temp_start.isoformat(), "temp_end": temp_end.isoformat(),
+        "west": west, "south": south, "east": east, "north": north, "crs": DEFAULT_CRS,
+        "bands": bands, "max_cc": max_cc,
+    }
+
+def extract_request(query: str, llm=None, cache=None, llm_cache=None):
+    """
+    Extract everything fetch_map needs from a query in a single LLM call.
+
+    Args:
+        query (str): Plain-English request of the user.
+        llm: Chat model with an invoke(prompt) method returning a message with .content; defaults to get_model().
+        cache (GeocodeCache): Optional geocode cache, used when the model gives no bounding box.
+        llm_cache (LLMCache): Optional response cache.
+
+    Returns:
+        dict: The validated request (see validate_request), or {"clarification": question} when the
+        model needs more information from the user.
+
+    Raises:
+        ValueError: If the response is not a valid request.
+    """
+    data = parse_json_object(ask(EXTRACTION_PROMPT.format(query=query), llm, llm_cache))
+    if data.get("clarification"):
+        return {"clarification": str(data["clarification"])}
+    try:
+        return validate_request(data, cache)
+    except (TypeError, AttributeError) as e:
+        # Any malformed field the checks above missed still surfaces as a rejected request
+        raise ValueError(f"Invalid request {data!r}: {e}") from e
+
+def normalize_location(location: str):
+    """Cache key of a place name: case-folded, with whitespace collapsed."""
+    return " ".join(location.split()).casefold()
+
+class GeocodeCache(SQLiteCache):
+    """SQLite-backed cache of geocoded places with TTL and LRU eviction. Thread-safe."""
+
+    table = "places"
+    key_column = "location"
+    columns = "lat REAL, lng REAL, fetched_at REAL, accessed_at REAL"
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, ttl=GEOCODE_TTL, max_entries=GEOCODE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        super().__init__(path, max_entries)
+
+    def get(self, location: str):
+        """Return the cached (lat, lng) of a place younger than the TTL, or None, and count the hit or miss."""
+        key = normalize_location(location)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT lat, lng, fetched_at FROM places WHERE location = ?", (key,)).fetchone()
+            if row is None or now - row[2] >= self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key, now)
+        return row[0], row[1]
+
+    def put(self, location: str, lat: float, lng: float):
+        now = time.time()
+        self._store((normalize_location(location), lat, lng, now, now))
+
+def get_coordinates(location: str, cache=None, api_url=GEOCODE_API_URL):
     """
     Get the latitude and longitude of a specified location using the Google Geocoding API.
 
     Args:
         location (str): The location or address to geocode.
+        cache (GeocodeCache): Optional cache; places geocoded before are served from it without a request.
+        api_url (str): URL of the Geocoding API endpoint.
 
     Returns:
         tuple: A tuple containing the latitude and longitude as floats (lat, lng), or None if the request fails.
     """
-    from dotenv import load_dotenv
-    import os
-    import requests
+    if cache is not None:
+        coordinates = cache.get(location)
+        if coordinates is not None:
+            return coordinates
 
-    # Load environment variables
-    load_dotenv()
-    api_key = os.environ.get('MAPS_API_KEY')  # Ensure the API key is stored in an environment variable
+    from requests.exceptions import RequestException
+
+    api_key = getenv('MAPS_API_KEY')  # Ensure the API key is stored in an environment variable
     
     if not api_key:
         raise ValueError("MAPS_API_KEY not found in environment variables.")
 
-    # Build the Geocoding API request URL
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?address={location}&key={api_key}"
-
     try:
-        # Make the API request
-        response = requests.get(url)
+        # Make the API request; params are URL-encoded, so addresses may contain spaces, '&' or '#'
+        response = get_session().get(api_url, params={"address": location, "key": api_key}, timeout=GEOCODE_TIMEOUT)
         response.raise_for_status()  # Raise an error for HTTP status codes >= 400
 
         # Parse the JSON response
@@ -134,40 +744,81 @@ def get_coordinates(location: str):
         if data.get('status') == 'OK':
             # Extract latitude and longitude
             geometry = data['results'][0]['geometry']['location']
+            if cache is not None:
+                cache.put(location, geometry['lat'], geometry['lng'])
             return geometry['lat'], geometry['lng']
         else:
             # Handle specific Geocoding API errors
             print(f"Geocoding failed with status: {data.get('status')}")
             return None
 
-    except requests.exceptions.RequestException as e:
+    except RequestException as e:
         # Handle request errors
         print(f"Error while making the Geocoding API request: {e}")
         return None
+
+def get_coordinates_many(locations, cache=None, api_url=GEOCODE_API_URL, max_workers=GEOCODE_WORKERS):
+    """
+    Geocode several locations concurrently; each distinct place is looked up once.
+
+    Args:
+        locations (list): Locations or addresses to geocode.
+        cache (GeocodeCache): Optional cache shared by the lookups.
+        api_url (str): URL of the Geocoding API endpoint.
+        max_workers (int): Lookups in flight at once.
+
+    Returns:
+        list: The (lat, lng) tuple or None of every location, in order.
+    """
+    unique = list(dict.fromkeys(normalize_location(location) for location in locations))
+    by_key = {normalize_location(location): location for location in locations}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = dict(zip(unique, pool.map(lambda key: get_coordinates(by_key[key], cache, api_url), unique)))
+    return [results[normalize_location(location)] for location in locations]
     
 # Main function to run the script
 if __name__ == "__main__":
     print("Welcome to the Satellite Map Query Assistant!")
+    geocode_cache = GeocodeCache()
+    llm_cache = LLMCache()
+    cube_cache = CubeCache()
     while True:
         user_input = input("\nEnter your query (or type 'exit' to quit): ")
         if user_input.lower() in {"exit", "quit"}:
             print("Goodbye!")
             break
 
+        if STRUCTURED_OUTPUT:
+            # One LLM call for the place, extent, time range, bands and cloud cover, straight into fetch_map
+            try:
+                request = extract_request(user_input, cache=geocode_cache, llm_cache=llm_cache)
+            except ValueError as e:
+                print(f"Could not understand the query: {e}")
+                continue
+            if "clarification" in request:
+                print(request["clarification"])
+                continue
+            print(f"Place: {request.pop('place')}")
+            print(f"LLM cache: {llm_cache.stats()}")
+            fetch_map(**request, cache=cube_cache)
+            continue
+
         # Process the user query and print the result
-        response = process_query(user_input)
+        response = process_query(user_input, llm_cache)
         print(response)
-        north_response = process_query(f"North-most location in {response}")
-        south_response = process_query(f"South-most location in {response}")
-        east_response = process_query(f"East-most location in {response}")
-        west_response = process_query(f"West-most location in {response}")
+        north_response = process_query(f"North-most location in {response}", llm_cache)
+        south_response = process_query(f"South-most location in {response}", llm_cache)
+        east_response = process_query(f"East-most location in {response}", llm_cache)
+        west_response = process_query(f"West-most location in {response}", llm_cache)
         print(north_response)
         print(south_response)
         print(east_response)
         print(west_response)
-        print(get_coordinates(response))
-        print(get_coordinates(north_response))
-        print(get_coordinates(south_response))
-        print(get_coordinates(east_response))
-        print(get_coordinates(west_response))
+        # Resolve the center and the four edges at once, skipping the places already in the cache
+        coordinates = get_coordinates_many(
+            [response, north_response, south_response, east_response, west_response], geocode_cache
+        )
+        for location in coordinates:
+            print(location)
+        print(f"Geocode cache: {geocode_cache.hits} hits, {geocode_cache.misses} misses")
 